@@ -0,0 +1,562 @@
+"""
+插件压测脚本：用伪造的消息事件直接驱动指令处理函数，无需 QQ 机器人与 MySQL 服务 (但需要安装 astrbot)。
+--backend mysql (默认) 时数据库由 fake_mysql 中的内存替身代替 (需要安装 aiomysql)；
+--backend sqlite 时使用临时目录中真实的 SQLite 数据库文件。
+
+场景：
+    checkin  零点签到潮：大量用户 (新老混合，部分重复签到) 同时签到
+    redeem   大量用户并发兑换同一商品 (兑换码数量少于人数，覆盖售罄路径)
+    shop     大量用户同时浏览商店
+    import   批量导入兑换码 (指令文本与附带文件交替，含部分重复码)
+    purge    批量踢人：大量退群通知夹杂在普通群消息中到达 (覆盖非通知事件的快速返回)
+    bulk     全群发放积分、导出全部用户数据再导入 (管理员批量操作)
+
+每个场景使用全新的插件实例与数据库，输出吞吐量与 p50 / p95 / p99 / max 延迟。
+MySQL 替身按 --rtt-ms 为每条语句模拟网络往返，结果反映的是插件自身的并发与往返次数开销，
+与真实 MySQL 的绝对数值不可直接比较，适合用于改动前后的对比。
+
+示例：
+    python benchmarks/bench_plugin.py --scenario checkin --users 20000 --concurrency 500
+    python benchmarks/bench_plugin.py --scenario all --rtt-ms 1 --pool-maxsize 20 --metrics
+    python benchmarks/bench_plugin.py --backend sqlite
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import inspect
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_PACKAGE = "checkin_plugin_pro"
+GROUP_ID = 100000
+BOT_ID = 99999
+ITEM_NAME = "体验卡"
+ITEM_COST = 10
+
+
+def load_plugin_module():
+    """以包的形式载入插件 (main.py 使用了相对导入)。"""
+    package = types.ModuleType(PLUGIN_PACKAGE)
+    package.__path__ = [str(PLUGIN_ROOT)]
+    sys.modules[PLUGIN_PACKAGE] = package
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.main")
+
+
+class FakeBot:
+    """模拟 aiocqhttp 客户端，每次调用等待 api_latency 秒。"""
+
+    def __init__(self, api_latency: float):
+        self.api_latency = api_latency
+        self.private_messages = 0
+        self.group_messages = 0
+        # 私聊消息的最后一行 (兑换码发送消息中即兑换码)
+        self.private_last_lines: list[str] = []
+        self.api_calls = 0
+        self.group_members: list[int] = []
+
+    async def send_private_msg(self, user_id, message):
+        await asyncio.sleep(self.api_latency)
+        self.private_messages += 1
+        self.private_last_lines.append(str(message).rsplit("\n", 1)[-1])
+
+    async def send_group_msg(self, group_id, message):
+        await asyncio.sleep(self.api_latency)
+        self.group_messages += 1
+
+    async def get_stranger_info(self, user_id, no_cache=False):
+        await asyncio.sleep(self.api_latency)
+        self.api_calls += 1
+        return {"user_id": user_id, "nickname": f"用户{user_id}"}
+
+    async def get_group_member_info(self, group_id, user_id, no_cache=False):
+        await asyncio.sleep(self.api_latency)
+        self.api_calls += 1
+        return {"user_id": user_id, "nickname": f"用户{user_id}", "card": ""}
+
+    async def get_group_member_list(self, group_id):
+        await asyncio.sleep(self.api_latency)
+        self.api_calls += 1
+        return [{"user_id": user_id, "nickname": f"用户{user_id}"} for user_id in self.group_members + [BOT_ID]]
+
+
+class FakeContext:
+    def get_platform(self, platform_type):
+        return None
+
+
+class _Sender:
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self.nickname = f"用户{user_id}"
+
+
+class _MessageObj:
+    def __init__(self, user_id, group_id, components):
+        self.sender = _Sender(user_id)
+        self.self_id = str(BOT_ID)
+        self.group_id = str(group_id)
+        self.message = components
+        self.raw_message = None
+
+
+def make_event_class(base):
+    class FakeEvent(base):
+        """只实现处理函数用到的接口，不调用父类构造函数以免依赖真实平台。"""
+
+        def __init__(self, bot, user_id, message_str, group_id=GROUP_ID, components=()):
+            self.bot = bot
+            self.message_str = message_str
+            self.message_obj = _MessageObj(user_id, group_id, list(components))
+            self._result = None
+
+        def get_sender_id(self):
+            return self.message_obj.sender.user_id
+
+        def get_sender_name(self):
+            return self.message_obj.sender.nickname
+
+        def get_group_id(self):
+            return self.message_obj.group_id
+
+        def get_messages(self):
+            return self.message_obj.message
+
+    return FakeEvent
+
+
+class FakeMySQLFixture:
+    """MySQL 后端：以内存替身代替 aiomysql 连接池。"""
+
+    def __init__(self, args):
+        from fake_mysql import FakeDatabase
+        self.db = FakeDatabase(rtt=args.rtt_ms / 1000, supports_skip_locked=not args.no_skip_locked)
+
+    def database_config(self) -> dict:
+        return {"backend": "mysql"}
+
+    def patch(self):
+        from fake_mysql import FakePool
+        db = self.db
+
+        async def create_pool(minsize=1, maxsize=10, **kwargs):
+            pool = FakePool(db, minsize=minsize, maxsize=maxsize)
+            for conn in [await pool._acquire() for _ in range(minsize)]:
+                pool.release(conn)
+            return pool
+
+        mysql_module = importlib.import_module(f"{PLUGIN_PACKAGE}.storage.mysql")
+        return mock.patch.object(mysql_module.aiomysql, "create_pool", create_pool)
+
+    def seed_users(self, users: dict[int, int], last_checkin):
+        self.db.seed_users(users, last_checkin)
+
+    def seed_codes(self, item_type: str, codes):
+        self.db.seed_codes(item_type, codes)
+
+    def add_whitelist(self, group_id: int):
+        self.db.whitelist.add(group_id)
+
+    def checked_in_count(self, day) -> int:
+        return sum(1 for row in self.db.users.values() if row[1] == day)
+
+    def outbox_codes(self) -> list[str]:
+        return [row["code"] for row in self.db.outbox.values()]
+
+    def code_count(self) -> int:
+        return len(self.db.code_ids)
+
+    def user_count(self) -> int:
+        return len(self.db.users)
+
+    def ledger_count(self) -> int:
+        return len(self.db.ledger)
+
+    def total_points(self) -> int:
+        return sum(row[0] for row in self.db.users.values())
+
+    def close(self):
+        pass
+
+
+class SQLiteFixture:
+    """SQLite 后端：临时目录中的真实数据库文件，种子数据直接写入。"""
+
+    def __init__(self, args):
+        self.directory = tempfile.mkdtemp(prefix="checkin-bench-")
+        self.path = os.path.join(self.directory, "checkin.db")
+
+    def database_config(self) -> dict:
+        return {"backend": "sqlite", "sqlite_path": self.path}
+
+    def patch(self):
+        return contextlib.nullcontext()
+
+    def _execute(self, query, rows=None):
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            if rows is None:
+                return conn.execute(query).fetchall()
+            conn.executemany(query, rows)
+
+    def seed_users(self, users: dict[int, int], last_checkin):
+        self._execute(
+            "INSERT INTO users (qq_id, points, last_checkin) VALUES (?, ?, ?)",
+            [(qq_id, points, last_checkin.isoformat() if last_checkin else None) for qq_id, points in users.items()]
+        )
+
+    def seed_codes(self, item_type: str, codes):
+        self._execute("INSERT OR IGNORE INTO codes (code, item_type) VALUES (?, ?)", [(code, item_type) for code in codes])
+
+    def add_whitelist(self, group_id: int):
+        self._execute("INSERT OR IGNORE INTO whitelisted_groups (group_id) VALUES (?)", [(group_id,)])
+
+    def checked_in_count(self, day) -> int:
+        return self._execute(f"SELECT COUNT(*) FROM users WHERE last_checkin = '{day.isoformat()}'")[0][0]
+
+    def outbox_codes(self) -> list[str]:
+        return [row[0] for row in self._execute("SELECT code FROM code_outbox")]
+
+    def code_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM codes")[0][0]
+
+    def user_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM users")[0][0]
+
+    def ledger_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM points_ledger")[0][0]
+
+    def total_points(self) -> int:
+        return self._execute("SELECT SUM(points) FROM users")[0][0] or 0
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+FIXTURES = {"mysql": FakeMySQLFixture, "sqlite": SQLiteFixture}
+
+
+def build_config(args, database: dict) -> dict:
+    return {
+        "database": {"pool_minsize": args.pool_minsize, "pool_maxsize": args.pool_maxsize, "ready_timeout": 30, **database},
+        "general_settings": {"timezone_offset_hours": 8.0, "import_batch_size": args.import_batch_size},
+        "rewards": {"first_checkin_points": 20, "min_points": 5, "max_points": 15, "crit_chance": 0.05},
+        "item_slot_1": {"enabled": True, "item_name": ITEM_NAME, "item_cost": ITEM_COST},
+    }
+
+
+def percentile(sorted_values, q: float) -> float:
+    """最近秩法求分位数 (精确值，非分桶估计)。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(q * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.main = load_plugin_module()
+        self.event_class = make_event_class(self.main.AiocqhttpMessageEvent)
+        self.reports = []
+
+    async def start_plugin(self, fixture, seed=None):
+        """启动插件 (建表)，写入种子数据后重新加载白名单与库存。"""
+        with fixture.patch():
+            plugin = self.main.CheckinPluginPro(FakeContext(), build_config(self.args, fixture.database_config()))
+            await plugin._init_task
+        fixture.add_whitelist(GROUP_ID)
+        if seed:
+            seed(fixture)
+        await plugin._refresh_whitelist()
+        await plugin._reconcile_stock()
+        plugin.metrics.reset()
+        return plugin
+
+    def new_fixture(self):
+        return FIXTURES[self.args.backend](self.args)
+
+    @staticmethod
+    async def stop_plugin(plugin, fixture):
+        await plugin.terminate()
+        fixture.close()
+
+    def event(self, bot, user_id, message_str, components=()):
+        return self.event_class(bot, user_id, message_str, components=components)
+
+    def notice_event(self, bot, raw_message: dict):
+        event = self.event_class(bot, raw_message.get("user_id", 0), "")
+        event.message_obj.raw_message = raw_message
+        return event
+
+    @staticmethod
+    async def drive(handler, *handler_args):
+        result = handler(*handler_args)
+        if inspect.isasyncgen(result):
+            return [item async for item in result]
+        await result
+        return []
+
+    async def run_ops(self, name: str, ops, concurrency: int, plugin, note: str = ""):
+        """以至多 concurrency 个并发执行 ops (无参协程函数列表)，记录每次调用的延迟。"""
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(op):
+            async with semaphore:
+                start = time.perf_counter()
+                await op()
+                latencies.append(time.perf_counter() - start)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(run(op) for op in ops))
+        wall = time.perf_counter() - wall_start
+        latencies.sort()
+        self.reports.append((name, len(latencies), wall, latencies, note))
+        if self.args.metrics:
+            print(f"\n==== {name} 插件内置统计 ====")
+            print(plugin.metrics.format_report())
+
+    async def scenario_checkin(self):
+        args = self.args
+        fixture = self.new_fixture()
+        plugin_tz_today = datetime.now(self.main.PluginSettings.from_config(build_config(args, {}), 10).tz).date()
+        existing = int(args.users * args.existing_ratio)
+        plugin = await self.start_plugin(fixture, lambda f: f.seed_users(
+            {10_000_000 + i: random.randint(0, 500) for i in range(existing)}, last_checkin=plugin_tz_today - timedelta(days=1)
+        ))
+        bot = FakeBot(args.api_latency_ms / 1000)
+
+        user_ids = [10_000_000 + i for i in range(args.users)]
+        repeats = random.sample(user_ids, int(args.users * args.repeat_ratio))
+        # 重复签到排在首轮之后，先打满数据库再覆盖内存快速拒绝路径
+        random.shuffle(user_ids)
+        ops = [lambda uid=uid: self.drive(plugin.handle_checkin, self.event(bot, uid, "签到")) for uid in user_ids + repeats]
+        await self.run_ops("签到潮", ops, args.concurrency, plugin,
+                           f"{args.users} 人 (老用户 {existing})，重复签到 {len(repeats)} 次")
+
+        checked_in = fixture.checked_in_count(plugin_tz_today)
+        assert checked_in == args.users, f"签到人数不符: {checked_in} != {args.users}"
+        await plugin._flush_ledger()
+        assert fixture.ledger_count() == args.users, f"积分流水条数不符: {fixture.ledger_count()} != {args.users}"
+        await self.stop_plugin(plugin, fixture)
+
+    async def scenario_redeem(self):
+        args = self.args
+        fixture = self.new_fixture()
+
+        def seed(f):
+            f.seed_users({20_000_000 + i: ITEM_COST * 3 for i in range(args.redeemers)}, last_checkin=None)
+            f.seed_codes("item_slot_1", (f"CODE-{i:08d}" for i in range(args.codes)))
+        plugin = await self.start_plugin(fixture, seed)
+        bot = FakeBot(args.api_latency_ms / 1000)
+
+        ops = [
+            lambda uid=20_000_000 + i: self.drive(plugin.redeem_item, self.event(bot, uid, f"兑换 {ITEM_NAME}"))
+            for i in range(args.redeemers)
+        ]
+        note = f"{args.redeemers} 人抢 {args.codes} 个兑换码"
+        if args.backend == "mysql":
+            note += f"，SKIP LOCKED={'关' if args.no_skip_locked else '开'}"
+        await self.run_ops("并发兑换同一商品", ops, args.concurrency, plugin, note)
+
+        expected = min(args.redeemers, args.codes)
+        # 已发送的记录会从发送箱删除：兑换出的码 = 已私聊发出的 + 仍在发送箱中的 (刚发出尚未删除的只算一次)
+        delivered = bot.private_last_lines
+        delivered_set = set(delivered)
+        redeemed = delivered + [code for code in fixture.outbox_codes() if code not in delivered_set]
+        assert len(redeemed) == expected, f"兑换成功数不符: {len(redeemed)} != {expected}"
+        assert fixture.code_count() == args.codes - expected, "剩余兑换码数量不符"
+        assert len(set(redeemed)) == expected, "同一兑换码被重复兑换"
+        await self.stop_plugin(plugin, fixture)
+
+    async def scenario_shop(self):
+        args = self.args
+        fixture = self.new_fixture()
+        plugin = await self.start_plugin(fixture, lambda f: f.seed_codes("item_slot_1", (f"CODE-{i:08d}" for i in range(1000))))
+        bot = FakeBot(args.api_latency_ms / 1000)
+
+        ops = [lambda uid=30_000_000 + i: self.drive(plugin.show_redeemable_items, self.event(bot, uid, "商")) for i in range(args.views)]
+        await self.run_ops("商店浏览", ops, args.concurrency, plugin, f"{args.views} 次浏览")
+        await self.stop_plugin(plugin, fixture)
+
+    async def scenario_import(self):
+        args = self.args
+        fixture = self.new_fixture()
+        plugin = await self.start_plugin(fixture)
+        bot = FakeBot(args.api_latency_ms / 1000)
+        files = []
+
+        ops = []
+        next_code = 0
+        for index in range(args.imports):
+            # 每批与上一批重叠 10%，覆盖库中已存在的重复码
+            start = max(0, next_code - args.import_size // 10)
+            codes = [f"IMPORT-{n:010d}" for n in range(start, start + args.import_size)]
+            next_code = start + args.import_size
+            if index % 2 == 0:
+                message = f"导入兑换码 {ITEM_NAME}\n" + "\n".join(codes)
+                ops.append(lambda message=message: self.drive(plugin.import_codes_command, self.event(bot, 1, message), ITEM_NAME))
+            else:
+                fd, path = tempfile.mkstemp(suffix=".txt")
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    fh.write("\n".join(codes))
+                files.append(path)
+                component = self.main.File(name=os.path.basename(path), file=path)
+                ops.append(lambda component=component: self.drive(
+                    plugin.import_codes_command, self.event(bot, 1, f"导入兑换码 {ITEM_NAME}", [component]), ITEM_NAME
+                ))
+
+        try:
+            # 导入是管理员操作，依次执行
+            await self.run_ops("批量导入兑换码", ops, 1, plugin, f"{args.imports} 次 × {args.import_size} 个")
+        finally:
+            for path in files:
+                os.remove(path)
+
+        assert fixture.code_count() == next_code, f"导入数量不符: {fixture.code_count()} != {next_code}"
+        assert plugin._stock_counts.get("item_slot_1") == next_code, "库存计数与导入数量不符"
+        await self.stop_plugin(plugin, fixture)
+
+    async def scenario_purge(self):
+        args = self.args
+        fixture = self.new_fixture()
+        members = [40_000_000 + i for i in range(args.purge_members)]
+        plugin = await self.start_plugin(fixture, lambda f: f.seed_users({uid: random.randint(0, 500) for uid in members}, last_checkin=None))
+        bot = FakeBot(args.api_latency_ms / 1000)
+
+        kicked = random.sample(members, args.purge_size)
+        ops = [
+            lambda uid=uid: self.drive(plugin.handle_group_member_decrease, self.notice_event(bot, {
+                "post_type": "notice", "notice_type": "group_decrease", "group_id": GROUP_ID,
+                "user_id": uid, "operator_id": 1, "sub_type": "kick",
+            }))
+            for uid in kicked
+        ]
+        # 每条退群通知之间夹杂若干条普通群消息，它们同样会分发给该处理器
+        ops += [
+            lambda uid=random.choice(members): self.drive(plugin.handle_group_member_decrease, self.event(bot, uid, "早上好"))
+            for _ in range(args.purge_size * args.purge_chatter)
+        ]
+        random.shuffle(ops)
+        await self.run_ops("批量踢人", ops, args.concurrency, plugin,
+                           f"{args.purge_size} 条退群通知 + {args.purge_size * args.purge_chatter} 条普通消息")
+
+        # 等待合并窗口结束、数据清理与公告完成
+        start = time.perf_counter()
+        await asyncio.gather(*plugin._departure_tasks)
+        print(f"退群事件合并处理耗时 {time.perf_counter() - start:.2f}s (含 {plugin.settings.member_leave_batch_seconds}s 合并窗口)，"
+              f"群公告 {bot.group_messages} 条，昵称查询 {bot.api_calls} 次")
+
+        remaining = fixture.user_count()
+        assert remaining == args.purge_members - args.purge_size, f"剩余用户数不符: {remaining}"
+        assert bot.group_messages == 1, f"应只发送一条汇总公告，实际 {bot.group_messages} 条"
+        await self.stop_plugin(plugin, fixture)
+
+    async def scenario_bulk(self):
+        args = self.args
+        fixture = self.new_fixture()
+        members = [50_000_000 + i for i in range(args.bulk_members)]
+        # 一半成员已有积分，另一半尚未建档
+        existing = {uid: random.randint(0, 500) for uid in members[::2]}
+        plugin = await self.start_plugin(fixture, lambda f: f.seed_users(existing, last_checkin=None))
+        bot = FakeBot(args.api_latency_ms / 1000)
+        bot.group_members = members
+        export_dir = tempfile.mkdtemp(prefix="checkin-export-")
+        exported = []
+
+        async def group_payout():
+            await self.drive(plugin.group_adjust_points_command, self.event(bot, 1, "/全群调整积分 10"), 10)
+
+        async def export():
+            await self.drive(plugin.export_users_command, self.event(bot, 1, "/导出用户数据"))
+            exported.extend(os.path.join(export_dir, name) for name in os.listdir(export_dir) if name.endswith(".csv"))
+
+        async def reimport():
+            component = self.main.File(name=os.path.basename(exported[-1]), file=exported[-1])
+            await self.drive(plugin.import_users_command, self.event(bot, 1, "/导入用户数据", [component]))
+
+        try:
+            with mock.patch.object(self.main.StarTools, "get_data_dir", return_value=export_dir):
+                await self.run_ops("全群发放积分", [group_payout], 1, plugin, f"{args.bulk_members} 名成员 (已建档 {len(existing)})")
+                expected_points = sum(existing.values()) + 10 * args.bulk_members
+                assert fixture.total_points() == expected_points, f"积分合计不符: {fixture.total_points()} != {expected_points}"
+                await self.run_ops("导出用户数据", [export], 1, plugin, f"{args.bulk_members} 行")
+                await self.run_ops("导入用户数据", [reimport], 1, plugin, f"{args.bulk_members} 行 (覆盖已有用户)")
+            assert fixture.user_count() == args.bulk_members, f"用户数不符: {fixture.user_count()}"
+            assert fixture.total_points() == expected_points, "导入后积分合计发生变化"
+        finally:
+            shutil.rmtree(export_dir, ignore_errors=True)
+        await self.stop_plugin(plugin, fixture)
+
+    def print_reports(self):
+        if self.args.backend == "mysql":
+            print(f"\nMySQL 替身：模拟往返 {self.args.rtt_ms} ms，连接池 {self.args.pool_minsize}~{self.args.pool_maxsize}，并发 {self.args.concurrency}")
+        else:
+            print(f"\nSQLite：并发 {self.args.concurrency}")
+        print(f"{'场景':<12} {'次数':>8} {'耗时(s)':>9} {'吞吐(次/s)':>11} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+        for name, count, wall, latencies, note in self.reports:
+            print(
+                f"{name:<12} {count:>8} {wall:>9.2f} {count / wall if wall else 0:>11.0f} "
+                f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.95) * 1000:>8.2f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.2f} {latencies[-1] * 1000 if latencies else 0:>8.2f}"
+            )
+            if note:
+                print(f"    {note}")
+
+
+SCENARIOS = ("checkin", "redeem", "shop", "import", "purge", "bulk")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="签到插件压测")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--backend", choices=tuple(FIXTURES), default="mysql", help="存储后端")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时在处理中的指令数")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="每条语句模拟的数据库往返时间")
+    parser.add_argument("--api-latency-ms", type=float, default=20, help="模拟的机器人接口调用耗时")
+    parser.add_argument("--pool-minsize", type=int, default=1)
+    parser.add_argument("--pool-maxsize", type=int, default=10)
+    parser.add_argument("--no-skip-locked", action="store_true", help="模拟不支持 SKIP LOCKED 的数据库")
+    parser.add_argument("--users", type=int, default=5000, help="签到潮人数")
+    parser.add_argument("--existing-ratio", type=float, default=0.8, help="签到潮中老用户的比例")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="签到潮中重复签到的比例")
+    parser.add_argument("--redeemers", type=int, default=1000, help="并发兑换人数")
+    parser.add_argument("--codes", type=int, default=500, help="被兑换商品的兑换码数量")
+    parser.add_argument("--views", type=int, default=5000, help="商店浏览次数")
+    parser.add_argument("--imports", type=int, default=6, help="导入次数")
+    parser.add_argument("--import-size", type=int, default=20000, help="每次导入的兑换码数量")
+    parser.add_argument("--import-batch-size", type=int, default=1000)
+    parser.add_argument("--purge-members", type=int, default=5000, help="批量踢人场景的群成员数")
+    parser.add_argument("--purge-size", type=int, default=500, help="被移出的人数")
+    parser.add_argument("--purge-chatter", type=int, default=10, help="每条退群通知对应的普通消息条数")
+    parser.add_argument("--bulk-members", type=int, default=20000, help="批量操作场景的群成员数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--metrics", action="store_true", help="同时输出插件内置的性能统计")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    logging.getLogger("astrbot").setLevel(logging.WARNING)
+    bench = Bench(args)
+    for name in SCENARIOS if args.scenario == "all" else (args.scenario,):
+        await getattr(bench, f"scenario_{name}")()
+    bench.print_reports()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
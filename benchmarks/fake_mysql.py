@@ -0,0 +1,702 @@
+"""
+基准测试用的本地数据库替身：以内存字典模拟插件用到的 MySQL 语句，接口与 aiomysql 的连接池一致。
+
+- 每次语句执行、BEGIN/COMMIT/ROLLBACK 都会等待一个可配置的模拟往返时延 (rtt)
+- 连接池按 maxsize 限制并发连接，取不到连接时排队等待
+- FOR UPDATE 会持有行锁直到事务结束，SKIP LOCKED 会跳过他人已锁定的行，写语句会等待行锁
+- 事务内的写入记录撤销日志，回滚时恢复
+- 统计兑换码数量的普通 SELECT 看不到其他连接尚未提交的增删 (模拟一致性读)
+- 锁定整张 item_stock 表时同时锁住间隙，其他连接对计数表的写入会等待
+
+只识别插件实际发出的语句；遇到未知语句会抛出 NotImplementedError，提醒同步更新替身。
+"""
+import asyncio
+import re
+from collections import defaultdict
+from datetime import date
+
+import aiomysql
+
+
+class FakeDatabase:
+    def __init__(self, rtt: float = 0.0005, supports_skip_locked: bool = True):
+        self.rtt = rtt
+        self.supports_skip_locked = supports_skip_locked
+        self.users: dict[int, list] = {}  # qq_id -> [points, last_checkin]
+        self.codes_by_item: dict[str, dict[int, str]] = defaultdict(dict)  # item_type -> {id: code}，按 id 递增
+        self.code_ids: dict[str, tuple[int, str]] = {}  # code -> (id, item_type)
+        self.whitelist: set[int] = set()
+        self.stock: dict[str, int] = {}
+        self.outbox: dict[int, dict] = {}
+        self.ledger: dict[int, tuple] = {}  # id -> (qq_id, delta, reason, item, created_at)，按 id 递增
+        self.ledger_summary: dict[int, list] = {}  # qq_id -> [delta_total, entries, last_at]
+        self.next_code_id = 1
+        self.next_outbox_id = 1
+        self.next_ledger_id = 1
+        self.statements = 0
+        self.lock_waits = 0
+        self._row_locks: dict[tuple, "FakeConnection"] = {}
+        self._lock_released = asyncio.Condition()
+        self.connections: list["FakeConnection"] = []
+
+    # --- 行锁 ---
+    def _locked_by_other(self, key, conn) -> bool:
+        owner = self._row_locks.get(key)
+        return owner is not None and owner is not conn
+
+    async def lock_row(self, conn: "FakeConnection", key, hold: bool):
+        """等待行锁；hold 为 True 时持有到事务结束。"""
+        if self._locked_by_other(key, conn):
+            self.lock_waits += 1
+            async with self._lock_released:
+                await self._lock_released.wait_for(lambda: not self._locked_by_other(key, conn))
+        if hold:
+            self._row_locks[key] = conn
+            conn.held_locks.append(key)
+
+    async def release_locks(self, conn: "FakeConnection"):
+        if not conn.held_locks:
+            return
+        for key in conn.held_locks:
+            if self._row_locks.get(key) is conn:
+                del self._row_locks[key]
+        conn.held_locks.clear()
+        async with self._lock_released:
+            self._lock_released.notify_all()
+
+    # --- 数据准备 ---
+    def seed_users(self, users: dict[int, int], last_checkin=None):
+        for qq_id, points in users.items():
+            self.users[int(qq_id)] = [points, last_checkin]
+
+    def seed_codes(self, item_type: str, codes):
+        for code in codes:
+            if code in self.code_ids:
+                continue
+            code_id = self.next_code_id
+            self.next_code_id += 1
+            self.codes_by_item[item_type][code_id] = code
+            self.code_ids[code] = (code_id, item_type)
+        self.stock[item_type] = len(self.codes_by_item[item_type])
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.split())
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection"):
+        self.conn = conn
+        self.db = conn.db
+        self.rowcount = -1
+        self.lastrowid = 0
+        self._rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    async def fetchall(self):
+        return tuple(self._rows)
+
+    async def fetchmany(self, size: int):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return tuple(rows)
+
+    async def execute(self, query: str, args=None):
+        await asyncio.sleep(self.db.rtt)
+        self.db.statements += 1
+        sql = _normalize(query)
+        args = tuple(args or ())
+        for pattern, handler in _HANDLERS:
+            match = pattern.match(sql)
+            if match:
+                self._rows, self.rowcount, self.lastrowid = [], 0, 0
+                await handler(self, match, args)
+                return self.rowcount
+        raise NotImplementedError(f"数据库替身不支持该语句: {sql}")
+
+    # --- 写入辅助：事务内记录撤销操作 ---
+    def _undo(self, action):
+        if self.conn.in_transaction:
+            self.conn.undo_log.append(action)
+
+    def _set_user(self, qq_id: int, row):
+        previous = self.db.users.get(qq_id)
+        previous = list(previous) if previous is not None else None
+        if row is None:
+            self.db.users.pop(qq_id, None)
+        else:
+            self.db.users[qq_id] = row
+
+        def restore():
+            if previous is None:
+                self.db.users.pop(qq_id, None)
+            else:
+                self.db.users[qq_id] = previous
+        self._undo(restore)
+
+    async def _lock_user(self, qq_id: int, hold: bool = None):
+        await self.db.lock_row(self.conn, ("users", qq_id), self.conn.in_transaction if hold is None else hold)
+
+    # --- 语句实现 ---
+    async def ddl(self, match, args):
+        self.rowcount = 0
+
+    async def index_exists(self, match, args):
+        self._rows = [(1,)]
+        self.rowcount = 1
+
+    async def select_one(self, match, args):
+        self._rows = [(1,)]
+        self.rowcount = 1
+
+    async def probe_skip_locked(self, match, args):
+        if not self.db.supports_skip_locked:
+            raise aiomysql.ProgrammingError(1064, "You have an error in your SQL syntax near 'SKIP LOCKED'")
+
+    async def checkin_upsert(self, match, args):
+        qq_id, first_points, today, delta = int(args[0]), args[1], args[2], args[3]
+        await self._lock_user(qq_id)
+        row = self.db.users.get(qq_id)
+        if row is None:
+            self._set_user(qq_id, [first_points, today])
+            self.rowcount = 1
+        elif row[1] is None or row[1] < today:
+            self._set_user(qq_id, [row[0] + delta, today])
+            self.rowcount = 2
+            self.lastrowid = row[0] + delta
+        else:
+            self.rowcount = 0
+
+    async def select_user_points(self, match, args):
+        qq_id = int(args[0])
+        if match.group(1):
+            await self._lock_user(qq_id, hold=True)
+        row = self.db.users.get(qq_id)
+        self._rows = [(row[0],)] if row else []
+        self.rowcount = len(self._rows)
+
+    def _ranked_users(self):
+        return sorted(((qq_id, row[0]) for qq_id, row in self.db.users.items()), key=lambda r: (-r[1], -r[0]))
+
+    async def select_leaderboard(self, match, args):
+        limit = args[0]
+        offset = args[1] if len(args) > 1 else 0
+        self._rows = self._ranked_users()[offset:offset + limit]
+        self.rowcount = len(self._rows)
+
+    async def count_rank(self, match, args):
+        points, _, qq_id = args
+        count = sum(1 for uid, row in self.db.users.items() if row[0] > points or (row[0] == points and uid > int(qq_id)))
+        self._rows = [(count,)]
+        self.rowcount = 1
+
+    async def update_user_points_delta(self, match, args):
+        delta, qq_id = match.group(1), int(args[1])
+        await self._lock_user(qq_id)
+        row = self.db.users.get(qq_id)
+        if row is None:
+            return
+        new_points = row[0] - args[0] if delta == "-" else args[0]
+        self._set_user(qq_id, [new_points, row[1]])
+        self.rowcount = 1
+
+    async def insert_user(self, match, args):
+        for index in range(0, len(args), 2):
+            qq_id = int(args[index])
+            await self._lock_user(qq_id)
+            if qq_id in self.db.users:
+                raise aiomysql.IntegrityError(1062, f"Duplicate entry '{qq_id}' for key 'PRIMARY'")
+            self._set_user(qq_id, [args[index + 1], None])
+            self.rowcount += 1
+
+    async def select_users_points_for_update(self, match, args):
+        rows = []
+        for qq_id in map(int, args):
+            await self._lock_user(qq_id, hold=True)
+            if qq_id in self.db.users:
+                rows.append((qq_id, self.db.users[qq_id][0]))
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    async def bulk_update_points(self, match, args):
+        delta = args[0]
+        for qq_id in map(int, args[1:]):
+            await self._lock_user(qq_id)
+            row = self.db.users.get(qq_id)
+            if row is not None:
+                self._set_user(qq_id, [max(0, row[0] + delta), row[1]])
+                self.rowcount += 1
+
+    async def select_all_users(self, match, args):
+        self._rows = [(qq_id, row[0], row[1]) for qq_id, row in sorted(self.db.users.items())]
+        self.rowcount = len(self._rows)
+
+    async def import_users(self, match, args):
+        for index in range(0, len(args), 3):
+            qq_id, points, last_checkin = int(args[index]), args[index + 1], args[index + 2]
+            await self._lock_user(qq_id)
+            self.rowcount += 2 if qq_id in self.db.users else 1
+            self._set_user(qq_id, [points, date.fromisoformat(last_checkin) if last_checkin else None])
+
+    async def select_users_for_update(self, match, args):
+        rows = []
+        for qq_id in map(int, args):
+            await self._lock_user(qq_id, hold=True)
+            if qq_id in self.db.users:
+                rows.append((qq_id,))
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    async def delete_users(self, match, args):
+        for qq_id in map(int, args):
+            await self._lock_user(qq_id)
+            if qq_id in self.db.users:
+                self._set_user(qq_id, None)
+                self.rowcount += 1
+
+    async def select_code_for_update(self, match, args):
+        item_type = args[0]
+        skip_locked = bool(match.group(1))
+        if skip_locked and not self.db.supports_skip_locked:
+            raise aiomysql.ProgrammingError(1064, "You have an error in your SQL syntax near 'SKIP LOCKED'")
+        while True:
+            candidates = self.db.codes_by_item.get(item_type, {})
+            chosen = None
+            for code_id, code in candidates.items():
+                if skip_locked and self.db._locked_by_other(("codes", code_id), self.conn):
+                    continue
+                chosen = (code_id, code)
+                break
+            if chosen is None:
+                return
+            await self.db.lock_row(self.conn, ("codes", chosen[0]), hold=True)
+            # 等锁期间该码可能已被别人删除，重新选择
+            if chosen[0] in self.db.codes_by_item.get(item_type, {}):
+                self._rows = [chosen]
+                self.rowcount = 1
+                return
+
+    async def delete_code(self, match, args):
+        code_id = args[0]
+        for item_type, codes in self.db.codes_by_item.items():
+            if code_id in codes:
+                code = codes.pop(code_id)
+                del self.db.code_ids[code]
+                self.rowcount = 1
+                self._track_code_change(item_type, -1)
+
+                def restore(item_type=item_type, code=code):
+                    self.db.codes_by_item[item_type][code_id] = code
+                    self.db.code_ids[code] = (code_id, item_type)
+                self._undo(restore)
+                return
+
+    async def insert_codes(self, match, args):
+        added = []
+        for index in range(0, len(args), 2):
+            code, item_type = args[index], args[index + 1]
+            if code in self.db.code_ids:
+                continue
+            code_id = self.db.next_code_id
+            self.db.next_code_id += 1
+            self.db.codes_by_item[item_type][code_id] = code
+            self.db.code_ids[code] = (code_id, item_type)
+            added.append((code_id, code, item_type))
+            self._track_code_change(item_type, 1)
+        self.rowcount = len(added)
+
+        def restore():
+            for code_id, code, item_type in added:
+                self.db.codes_by_item[item_type].pop(code_id, None)
+                self.db.code_ids.pop(code, None)
+        self._undo(restore)
+
+    def _track_code_change(self, item_type: str, delta: int):
+        if self.conn.in_transaction:
+            self.conn.code_changes[item_type] += delta
+
+    async def count_codes(self, match, args):
+        # 扣除其他连接未提交的增删，得到已提交的数量
+        counts = {item_type: len(codes) for item_type, codes in self.db.codes_by_item.items()}
+        for conn in self.db.connections:
+            if conn is not self.conn:
+                for item_type, delta in conn.code_changes.items():
+                    counts[item_type] = counts.get(item_type, 0) - delta
+        self._rows = [(item_type, count) for item_type, count in counts.items() if count]
+        self.rowcount = len(self._rows)
+
+    async def lock_stock_table(self, match, args):
+        await self.db.lock_row(self.conn, ("stock",), hold=True)
+        for item_type in list(self.db.stock):
+            await self.db.lock_row(self.conn, ("stock", item_type), hold=True)
+        self._rows = [(item_type,) for item_type in self.db.stock]
+        self.rowcount = len(self._rows)
+
+    async def _lock_stock_row(self, item_type: str):
+        # 整表 (含间隙) 被锁定时等待，再锁定该行
+        await self.db.lock_row(self.conn, ("stock",), hold=False)
+        await self.db.lock_row(self.conn, ("stock", item_type), self.conn.in_transaction)
+
+    async def select_stock(self, match, args):
+        self._rows = list(self.db.stock.items())
+        self.rowcount = len(self._rows)
+
+    async def delete_stock(self, match, args):
+        previous = dict(self.db.stock)
+        self.rowcount = len(previous)
+        self.db.stock.clear()
+        self._undo(lambda: self.db.stock.update(previous))
+
+    async def insert_stock(self, match, args):
+        accumulate = bool(match.group(1))
+        for index in range(0, len(args), 2):
+            await self._lock_stock_row(args[index])
+        previous = dict(self.db.stock)
+        for index in range(0, len(args), 2):
+            item_type, stock = args[index], args[index + 1]
+            self.db.stock[item_type] = (self.db.stock.get(item_type, 0) if accumulate else 0) + stock
+        self.rowcount = len(args) // 2
+
+        def restore():
+            self.db.stock.clear()
+            self.db.stock.update(previous)
+        self._undo(restore)
+
+    async def update_stock(self, match, args):
+        delta, item_type = args
+        await self._lock_stock_row(item_type)
+        if item_type in self.db.stock:
+            self.db.stock[item_type] = max(0, self.db.stock[item_type] + delta)
+            self.rowcount = 1
+
+    async def select_whitelist(self, match, args):
+        self._rows = [(group_id,) for group_id in self.db.whitelist]
+        self.rowcount = len(self._rows)
+
+    async def insert_whitelist(self, match, args):
+        group_id = int(args[0])
+        if group_id not in self.db.whitelist:
+            self.db.whitelist.add(group_id)
+            self.rowcount = 1
+
+    async def delete_whitelist(self, match, args):
+        group_id = int(args[0])
+        if group_id in self.db.whitelist:
+            self.db.whitelist.discard(group_id)
+            self.rowcount = 1
+
+    async def insert_outbox(self, match, args):
+        outbox_id = self.db.next_outbox_id
+        self.db.next_outbox_id += 1
+        qq_id, item_name, cost, code = args
+        self.db.outbox[outbox_id] = {
+            "qq_id": int(qq_id), "item_name": item_name, "cost": cost, "code": code,
+            "status": 0, "attempts": 0, "next_attempt_at": 0, "last_error": None,
+        }
+        self.rowcount = 1
+        self.lastrowid = outbox_id
+        self._undo(lambda: self.db.outbox.pop(outbox_id, None))
+
+    async def select_due_outbox(self, match, args):
+        status, now, limit = args
+        rows = []
+        for outbox_id, row in self.db.outbox.items():
+            if row["status"] == status and row["next_attempt_at"] <= now:
+                rows.append((outbox_id, row["qq_id"], row["item_name"], row["cost"], row["code"], row["attempts"]))
+                if len(rows) >= limit:
+                    break
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    async def claim_outbox(self, match, args):
+        lease_until, outbox_id, status, now = args
+        row = self.db.outbox.get(outbox_id)
+        if row and row["status"] == status and row["next_attempt_at"] <= now:
+            row["next_attempt_at"] = lease_until
+            self.rowcount = 1
+
+    async def delete_outbox(self, match, args):
+        outbox_id = args[0]
+        row = self.db.outbox.pop(outbox_id, None)
+        if row:
+            self.rowcount = 1
+            self._undo(lambda: self.db.outbox.__setitem__(outbox_id, row))
+
+    async def purge_sent_outbox(self, match, args):
+        sent = [outbox_id for outbox_id, row in self.db.outbox.items() if row["status"] == args[0]]
+        for outbox_id in sent:
+            del self.db.outbox[outbox_id]
+        self.rowcount = len(sent)
+
+    async def mark_outbox_failed(self, match, args):
+        status, attempts, next_attempt_at, last_error, outbox_id = args
+        row = self.db.outbox.get(outbox_id)
+        if row:
+            row.update(status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=last_error)
+            self.rowcount = 1
+
+    async def requeue_outbox(self, match, args):
+        pending, failed = args[0], args[1]
+        qq_id = int(args[2]) if len(args) > 2 else None
+        for row in self.db.outbox.values():
+            if row["status"] == failed and (qq_id is None or row["qq_id"] == qq_id):
+                row.update(status=pending, attempts=0, next_attempt_at=0)
+                self.rowcount += 1
+
+    async def insert_ledger(self, match, args):
+        added = []
+        for index in range(0, len(args), 5):
+            ledger_id = self.db.next_ledger_id
+            self.db.next_ledger_id += 1
+            qq_id, delta, reason, item, created_at = args[index:index + 5]
+            self.db.ledger[ledger_id] = (int(qq_id), delta, reason, item, created_at)
+            added.append(ledger_id)
+        self.rowcount = len(added)
+
+        def restore():
+            for ledger_id in added:
+                self.db.ledger.pop(ledger_id, None)
+        self._undo(restore)
+
+    async def select_ledger_page(self, match, args):
+        qq_id, limit = int(args[0]), args[-1]
+        before_id = args[1] if len(args) > 2 else None
+        rows = []
+        for ledger_id in reversed(self.db.ledger):
+            row = self.db.ledger[ledger_id]
+            if row[0] == qq_id and (before_id is None or ledger_id < before_id):
+                rows.append((ledger_id,) + row[1:])
+                if len(rows) >= limit:
+                    break
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    async def select_ledger_summary(self, match, args):
+        row = self.db.ledger_summary.get(int(args[0]))
+        self._rows = [tuple(row)] if row else []
+        self.rowcount = len(self._rows)
+
+    async def scan_ledger_head(self, match, args):
+        limit, before = args
+        head = list(self.db.ledger.items())[:limit]
+        old_ids = [ledger_id for ledger_id, row in head if row[4] < before]
+        self._rows = [(max(old_ids) if old_ids else None,)]
+        self.rowcount = 1
+
+    async def summarize_ledger(self, match, args):
+        upper_id = args[0]
+        totals = {}
+        for ledger_id, (qq_id, delta, _, _, created_at) in self.db.ledger.items():
+            if ledger_id > upper_id:
+                break
+            total = totals.setdefault(qq_id, [0, 0, 0])
+            total[0] += delta
+            total[1] += 1
+            total[2] = max(total[2], created_at)
+        previous = {qq_id: list(self.db.ledger_summary[qq_id]) for qq_id in totals if qq_id in self.db.ledger_summary}
+        for qq_id, (delta_total, entries, last_at) in totals.items():
+            row = self.db.ledger_summary.setdefault(qq_id, [0, 0, 0])
+            row[0] += delta_total
+            row[1] += entries
+            row[2] = max(row[2], last_at)
+        self.rowcount = len(totals)
+
+        def restore():
+            for qq_id in totals:
+                if qq_id in previous:
+                    self.db.ledger_summary[qq_id] = previous[qq_id]
+                else:
+                    self.db.ledger_summary.pop(qq_id, None)
+        self._undo(restore)
+
+    async def delete_ledger_head(self, match, args):
+        upper_id = args[0]
+        removed = {ledger_id: row for ledger_id, row in self.db.ledger.items() if ledger_id <= upper_id}
+        for ledger_id in removed:
+            del self.db.ledger[ledger_id]
+        self.rowcount = len(removed)
+        self._undo(lambda: self._restore_ledger(removed))
+
+    async def delete_ledger_users(self, match, args):
+        qq_ids = set(map(int, args))
+        if match.group(1) == "points_ledger_summary":
+            previous = {qq_id: self.db.ledger_summary.pop(qq_id) for qq_id in qq_ids if qq_id in self.db.ledger_summary}
+            self.rowcount = len(previous)
+            self._undo(lambda: self.db.ledger_summary.update(previous))
+            return
+        removed = {ledger_id: row for ledger_id, row in self.db.ledger.items() if row[0] in qq_ids}
+        for ledger_id in removed:
+            del self.db.ledger[ledger_id]
+        self.rowcount = len(removed)
+        self._undo(lambda: self._restore_ledger(removed))
+
+    def _restore_ledger(self, removed: dict):
+        self.db.ledger.update(removed)
+        # 保持按 id 递增的顺序
+        ordered = sorted(self.db.ledger.items())
+        self.db.ledger.clear()
+        self.db.ledger.update(ordered)
+
+
+_HANDLERS = [(re.compile(pattern), getattr(FakeCursor, name)) for pattern, name in [
+    (r"^(CREATE TABLE|ALTER TABLE)", "ddl"),
+    (r"^SELECT 1 FROM information_schema\.statistics", "index_exists"),
+    (r"^SELECT 1$", "select_one"),
+    (r"^SELECT id FROM codes WHERE 1 = 0 FOR UPDATE SKIP LOCKED$", "probe_skip_locked"),
+    (r"^INSERT INTO users \(qq_id, points, last_checkin\) VALUES \(%s, %s, %s\)(?:, \(%s, %s, %s\))* ON DUPLICATE KEY UPDATE points = VALUES\(points\), last_checkin = VALUES\(last_checkin\)$", "import_users"),
+    (r"^INSERT INTO users \(qq_id, points, last_checkin\) VALUES \(%s, %s, %s\) ON DUPLICATE KEY UPDATE", "checkin_upsert"),
+    (r"^SELECT points FROM users WHERE qq_id = %s( FOR UPDATE)?$", "select_user_points"),
+    (r"^SELECT qq_id, points FROM users ORDER BY points DESC, qq_id DESC LIMIT %s( OFFSET %s)?$", "select_leaderboard"),
+    (r"^SELECT COUNT\(\*\) FROM users WHERE points >= %s AND \(points > %s OR qq_id > %s\)$", "count_rank"),
+    (r"^UPDATE users SET points = (?:points (-) )?%s WHERE qq_id = %s$", "update_user_points_delta"),
+    (r"^INSERT INTO users \(qq_id, points, last_checkin\) VALUES \(%s, %s, NULL\)(?:, \(%s, %s, NULL\))*$", "insert_user"),
+    (r"^SELECT qq_id, points FROM users WHERE qq_id IN \((?:%s, )*%s\) FOR UPDATE$", "select_users_points_for_update"),
+    (r"^UPDATE users SET points = GREATEST\(points \+ %s, 0\) WHERE qq_id IN \((?:%s, )*%s\)$", "bulk_update_points"),
+    (r"^SELECT qq_id, points, last_checkin FROM users ORDER BY qq_id$", "select_all_users"),
+    (r"^SELECT qq_id FROM users WHERE qq_id IN \((?:%s, )*%s\) FOR UPDATE$", "select_users_for_update"),
+    (r"^DELETE FROM users WHERE qq_id IN \((?:%s, )*%s\)$", "delete_users"),
+    (r"^SELECT id, code FROM codes WHERE item_type = %s ORDER BY id LIMIT 1 FOR UPDATE( SKIP LOCKED)?$", "select_code_for_update"),
+    (r"^DELETE FROM codes WHERE id = %s$", "delete_code"),
+    (r"^INSERT IGNORE INTO codes \(code, item_type\) VALUES", "insert_codes"),
+    (r"^SELECT item_type, COUNT\(\*\) FROM codes GROUP BY item_type$", "count_codes"),
+    (r"^SELECT item_type, stock FROM item_stock$", "select_stock"),
+    (r"^SELECT item_type FROM item_stock FOR UPDATE$", "lock_stock_table"),
+    (r"^DELETE FROM item_stock$", "delete_stock"),
+    (r"^INSERT INTO item_stock \(item_type, stock\) VALUES .*?( ON DUPLICATE KEY UPDATE stock = stock \+ VALUES\(stock\))?$", "insert_stock"),
+    (r"^UPDATE item_stock SET stock = GREATEST\(stock \+ %s, 0\) WHERE item_type = %s$", "update_stock"),
+    (r"^SELECT group_id FROM whitelisted_groups$", "select_whitelist"),
+    (r"^INSERT IGNORE INTO whitelisted_groups \(group_id\) VALUES \(%s\)$", "insert_whitelist"),
+    (r"^DELETE FROM whitelisted_groups WHERE group_id = %s$", "delete_whitelist"),
+    (r"^INSERT INTO code_outbox \(qq_id, item_name, cost, code\) VALUES", "insert_outbox"),
+    (r"^SELECT id, qq_id, item_name, cost, code, attempts FROM code_outbox WHERE status = %s AND next_attempt_at <= %s", "select_due_outbox"),
+    (r"^UPDATE code_outbox SET next_attempt_at = %s WHERE id = %s AND status = %s AND next_attempt_at <= %s$", "claim_outbox"),
+    (r"^DELETE FROM code_outbox WHERE id = %s$", "delete_outbox"),
+    (r"^DELETE FROM code_outbox WHERE status = %s$", "purge_sent_outbox"),
+    (r"^UPDATE code_outbox SET status = %s, attempts = %s, next_attempt_at = %s, last_error = %s WHERE id = %s$", "mark_outbox_failed"),
+    (r"^UPDATE code_outbox SET status = %s, attempts = 0, next_attempt_at = 0 WHERE status = %s", "requeue_outbox"),
+    (r"^INSERT INTO points_ledger \(qq_id, delta, reason, item, created_at\) VALUES", "insert_ledger"),
+    (r"^SELECT id, delta, reason, item, created_at FROM points_ledger WHERE qq_id = %s( AND id < %s)? ORDER BY id DESC LIMIT %s$", "select_ledger_page"),
+    (r"^SELECT delta_total, entries, last_at FROM points_ledger_summary WHERE qq_id = %s$", "select_ledger_summary"),
+    (r"^SELECT MAX\(id\) FROM \(SELECT id, created_at FROM points_ledger ORDER BY id LIMIT %s\) AS head WHERE created_at < %s$", "scan_ledger_head"),
+    (r"^INSERT INTO points_ledger_summary \(qq_id, delta_total, entries, last_at\) SELECT qq_id, SUM\(delta\), COUNT\(\*\), MAX\(created_at\) FROM points_ledger WHERE id <= %s GROUP BY qq_id ON DUPLICATE KEY UPDATE", "summarize_ledger"),
+    (r"^DELETE FROM points_ledger WHERE id <= %s$", "delete_ledger_head"),
+    (r"^DELETE FROM (points_ledger|points_ledger_summary) WHERE qq_id IN \((?:%s, )*%s\)$", "delete_ledger_users"),
+]]
+
+
+class FakeConnection:
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+        self.closed = False
+        self.in_transaction = False
+        self.undo_log = []
+        self.held_locks = []
+        self.code_changes: dict[str, int] = defaultdict(int)
+        db.connections.append(self)
+
+    def cursor(self, cursor_class=None):
+        # 服务端游标 (SSCursor) 与普通游标共用实现：结果集已在内存中，fetchmany 逐批取出
+        return FakeCursor(self)
+
+    async def begin(self):
+        await asyncio.sleep(self.db.rtt)
+        self.in_transaction = True
+
+    async def _end_transaction(self):
+        self.in_transaction = False
+        self.undo_log.clear()
+        self.code_changes.clear()
+        await self.db.release_locks(self)
+
+    async def commit(self):
+        await asyncio.sleep(self.db.rtt)
+        await self._end_transaction()
+
+    async def rollback(self):
+        await asyncio.sleep(self.db.rtt)
+        for action in reversed(self.undo_log):
+            action()
+        await self._end_transaction()
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+    def close(self):
+        self.closed = True
+
+
+class _AcquireContext:
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+        self.conn = None
+
+    async def __aenter__(self):
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        self.pool.release(self.conn)
+        return False
+
+
+class FakePool:
+    """与 aiomysql.Pool 接口一致的连接池替身"""
+
+    def __init__(self, db: FakeDatabase, minsize: int = 1, maxsize: int = 10):
+        self.db = db
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self._free: list[FakeConnection] = []
+        self._used: set[FakeConnection] = set()
+        self._cond = asyncio.Condition()
+
+    @property
+    def size(self):
+        return len(self._free) + len(self._used)
+
+    @property
+    def freesize(self):
+        return len(self._free)
+
+    def acquire(self):
+        return _AcquireContext(self)
+
+    async def _acquire(self) -> FakeConnection:
+        async with self._cond:
+            while not self._free and self.size >= self.maxsize:
+                await self._cond.wait()
+            if self._free:
+                conn = self._free.pop()
+            else:
+                conn = FakeConnection(self.db)
+                self._used.add(conn)
+                # 模拟建立连接的握手开销
+                await asyncio.sleep(self.db.rtt * 3)
+                return conn
+            self._used.add(conn)
+            return conn
+
+    def release(self, conn: FakeConnection):
+        self._used.discard(conn)
+        if not conn.closed and not conn.in_transaction:
+            self._free.append(conn)
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify()
+
+    def close(self):
+        for conn in self._free:
+            conn.close()
+        self._free.clear()
+
+    async def wait_closed(self):
+        pass
@@ -0,0 +1,108 @@
+import bisect
+
+
+class TopNCache:
+    """
+    积分排行榜前 N 名的增量缓存，排序规则与数据库查询一致：points 降序，qq_id 降序。
+
+    不变式：未完整载入全部用户时 (complete 为 False)，缓存外任何用户的排名都在缓存中最后一名之后。
+    积分变化时只需与缓存末位比较即可维护；缓存因用户掉出而变短时，由调用方重新载入。
+    载入期间 (begin_load 到 load 之间) 的积分变动会被记录，载入后重放到查询结果上；同一时间只应有一次载入。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.loaded = False
+        self.complete = False
+        self._keys: list[tuple[int, int]] = []
+        self._points: dict[int, int] = {}
+        # 载入期间记录的变动 (qq_id, points)，points 为 None 表示移除；失效时置为 None，放弃本次载入
+        self._replay: list[tuple[int, int | None]] | None = None
+
+    @staticmethod
+    def _key(qq_id: int, points: int) -> tuple[int, int]:
+        return (-points, -qq_id)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def begin_load(self):
+        """在查询前调用：此后到 load() 之间的积分变动会在载入后重放。"""
+        self._replay = []
+
+    def cancel_load(self):
+        """查询失败时调用，停止记录变动。"""
+        self._replay = None
+
+    def load(self, rows) -> bool:
+        """
+        以数据库按排行顺序查询出的前 capacity 行 (qq_id, points) 重建缓存，并重放查询期间的积分变动。
+        :return: 查询期间缓存被整体失效 (批量变动) 时放弃载入并返回 False
+        """
+        replay, self._replay = self._replay, None
+        if replay is None:
+            return False
+        self._points = {int(qq_id): points for qq_id, points in rows}
+        self._keys = sorted(self._key(qq_id, points) for qq_id, points in self._points.items())
+        self.complete = len(self._keys) < self.capacity
+        self.loaded = True
+        # 变动记录的是最新积分，与查询结果是否已包含该变动无关，重放是幂等的
+        for qq_id, points in replay:
+            if points is None:
+                self._discard(qq_id)
+            else:
+                self._apply(qq_id, points)
+        return True
+
+    def invalidate(self):
+        self.loaded = False
+        self.complete = False
+        self._replay = None
+        self._keys.clear()
+        self._points.clear()
+
+    def _discard(self, qq_id: int):
+        points = self._points.pop(qq_id, None)
+        if points is not None:
+            del self._keys[bisect.bisect_left(self._keys, self._key(qq_id, points))]
+
+    def update(self, qq_id: int, points: int):
+        """记录用户的最新积分。"""
+        qq_id = int(qq_id)
+        if self._replay is not None:
+            self._replay.append((qq_id, points))
+        if self.loaded:
+            self._apply(qq_id, points)
+
+    def _apply(self, qq_id: int, points: int):
+        self._discard(qq_id)
+        key = self._key(qq_id, points)
+        if not self.complete and (not self._keys or key > self._keys[-1]):
+            # 排在缓存末位之后，缓存外可能有人排在他前面，不纳入缓存
+            return
+        bisect.insort(self._keys, key)
+        self._points[qq_id] = points
+        if len(self._keys) > self.capacity:
+            _, last_qq = self._keys.pop()
+            del self._points[-last_qq]
+            self.complete = False
+
+    def remove(self, qq_id: int):
+        if self._replay is not None:
+            self._replay.append((int(qq_id), None))
+        if self.loaded:
+            self._discard(int(qq_id))
+
+    def covers(self, count: int) -> bool:
+        """缓存能否直接提供前 count 名。"""
+        return self.loaded and (self.complete or len(self._keys) >= count)
+
+    def page(self, offset: int, limit: int) -> list[tuple[int, int]]:
+        return [(-neg_qq, -neg_points) for neg_points, neg_qq in self._keys[offset:offset + limit]]
+
+    def rank_of(self, qq_id: int):
+        """返回 (名次, 积分)；用户不在缓存中时返回 None。"""
+        points = self._points.get(int(qq_id))
+        if points is None:
+            return None
+        return bisect.bisect_left(self._keys, self._key(int(qq_id), points)) + 1, points
@@ -1,19 +1,33 @@
 import asyncio
-import aiomysql
+import csv
+import os
 import random
+import time
+from dataclasses import dataclass
 from datetime import date, datetime, timezone, timedelta
 from functools import wraps
+from types import MappingProxyType
+from typing import Mapping
 from astrbot.api.event import filter, AstrMessageEvent
-from astrbot.api.star import Context, Star, register
+from astrbot.api.star import Context, Star, StarTools, register
 from astrbot.api import logger, AstrBotConfig
+from astrbot.api.message_components import File, Reply
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
 
+from .leaderboard import TopNCache
+from .metrics import Metrics
+from .ttl_cache import TTLCache
+from .storage import (
+    CHECKIN_NEW, CHECKIN_UPDATED, REDEEM_INSUFFICIENT_POINTS, REDEEM_OUT_OF_STOCK, StorageBackend, create_storage,
+)
+
 def require_whitelisted_group(func):
     """装饰器：确保指令在白名单群组中执行"""
     @wraps(func)
     async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
         group_id = event.get_group_id()
-        if not group_id or not await self.is_group_whitelisted(group_id):
+        # 数据库未就绪时无法确认白名单，保持静默
+        if not group_id or not await self.wait_until_ready() or not await self.is_group_whitelisted(group_id):
             return
         
         # 修复：被装饰的函数是异步生成器，我们必须遍历它并产生结果
@@ -21,169 +35,593 @@ def require_whitelisted_group(func):
             yield res
     return wrapper
 
+def require_database_ready(func):
+    """装饰器：等待数据库就绪 (有超时)，超时则提示稍后再试"""
+    @wraps(func)
+    async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+        if not await self.wait_until_ready():
+            yield event.plain_result("插件数据库尚未就绪，请稍后再试。")
+            return
+        async for res in func(self, event, *args, **kwargs):
+            yield res
+    return wrapper
+
+def instrumented_handler(name: str):
+    """装饰器：记录处理函数自身的耗时 (不含框架发送回复的时间)"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+            elapsed = 0.0
+            gen = func(self, event, *args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        res = await gen.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        elapsed += time.perf_counter() - start
+                    yield res
+            finally:
+                self.metrics.observe("handler", name, elapsed)
+                await gen.aclose()
+        return wrapper
+    return decorator
+
+def _iter_code_lines(fh, is_csv: bool):
+    """逐行读取兑换码文件；CSV 文件取每行第一列并跳过表头。"""
+    if not is_csv:
+        yield from fh
+        return
+    for index, row in enumerate(csv.reader(fh)):
+        if not row:
+            continue
+        if index == 0 and row[0].strip().lower() in ("code", "codes", "兑换码"):
+            continue
+        yield row[0]
+
+def _read_code_batch(lines, batch_size: int) -> list:
+    """从行迭代器中读取至多 batch_size 个非空兑换码。"""
+    batch = []
+    for line in lines:
+        code = line.strip()
+        if code:
+            batch.append(code)
+            if len(batch) >= batch_size:
+                break
+    return batch
+
+def _clamp_digits(text: str, upper: int) -> int:
+    """将消息中的数字串转为不超过 upper 的整数，过长的数字串直接按 upper 处理。"""
+    text = text.lstrip("0")
+    if len(text) > len(str(upper)):
+        return upper
+    return min(int(text or 0), upper)
+
+def _parse_user_row(row: list) -> tuple | None:
+    """将用户数据 CSV 的一行解析为 (qq_id, points, last_checkin)，格式无效时返回 None。"""
+    try:
+        qq_id, points = int(row[0]), int(row[1])
+        last_checkin = row[2].strip() if len(row) > 2 else ""
+        if last_checkin:
+            last_checkin = date.fromisoformat(last_checkin).isoformat()
+    except (IndexError, ValueError):
+        return None
+    # qq_id 存为 BIGINT、points 存为 INT，超出范围的行会让整个导入事务失败
+    if not 0 < qq_id <= 2 ** 63 - 1 or not 0 <= points <= 2 ** 31 - 1:
+        return None
+    return qq_id, points, last_checkin or None
+
+@dataclass(frozen=True, slots=True)
+class CatalogItem:
+    """已启用的商品栏"""
+    internal_id: str
+    item_name: str
+    item_cost: int | None
+
+@dataclass(frozen=True, slots=True)
+class PluginSettings:
+    """
+    由插件配置编译出的只读快照，避免在每条消息中重复读取、解析配置。
+    AstrBot 在配置保存后会重新加载插件，快照随新实例重建。
+    """
+    items: tuple[CatalogItem, ...]
+    items_by_name: Mapping[str, CatalogItem]
+    tz: timezone
+    first_checkin_points: int
+    min_points: int
+    max_points: int
+    crit_chance: float
+    whitelist_refresh_seconds: int
+    import_batch_size: int
+    stock_reconcile_seconds: int
+    delivery_concurrency: int
+    delivery_rate_per_second: float
+    delivery_max_attempts: int
+    metrics_log_interval_seconds: int
+    member_leave_batch_seconds: float
+    ledger_retention_days: int
+    db_ready_timeout: float
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        return name.strip().lower()
+
+    @classmethod
+    def from_config(cls, config, max_item_slots: int) -> "PluginSettings":
+        items = []
+        items_by_name = {}
+        for i in range(1, max_item_slots + 1):
+            slot_config = config.get(f'item_slot_{i}', {})
+            if not slot_config.get('enabled') or not slot_config.get('item_name'):
+                continue
+            item = CatalogItem(f'item_slot_{i}', slot_config.get('item_name'), slot_config.get('item_cost'))
+            items.append(item)
+            # 重名时以编号靠前的商品栏为准
+            items_by_name.setdefault(cls.normalize_name(item.item_name), item)
+
+        general_conf = config.get('general_settings', {})
+        rewards_conf = config.get('rewards', {})
+        return cls(
+            items=tuple(items),
+            items_by_name=MappingProxyType(items_by_name),
+            tz=timezone(timedelta(hours=general_conf.get('timezone_offset_hours', 8.0))),
+            first_checkin_points=rewards_conf.get('first_checkin_points', 20),
+            min_points=rewards_conf.get('min_points', 5),
+            max_points=rewards_conf.get('max_points', 15),
+            crit_chance=rewards_conf.get('crit_chance', 0.05),
+            whitelist_refresh_seconds=general_conf.get('whitelist_refresh_seconds', 300),
+            import_batch_size=max(1, int(general_conf.get('import_batch_size', 1000))),
+            stock_reconcile_seconds=general_conf.get('stock_reconcile_seconds', 600),
+            delivery_concurrency=max(1, int(general_conf.get('delivery_concurrency', 3))),
+            delivery_rate_per_second=general_conf.get('delivery_rate_per_second', 2.0),
+            delivery_max_attempts=max(1, int(general_conf.get('delivery_max_attempts', 5))),
+            metrics_log_interval_seconds=general_conf.get('metrics_log_interval_seconds', 0),
+            member_leave_batch_seconds=max(0.0, float(general_conf.get('member_leave_batch_seconds', 2.0))),
+            ledger_retention_days=max(0, int(general_conf.get('ledger_retention_days', 90))),
+            db_ready_timeout=config.get('database', {}).get('ready_timeout', 5.0),
+        )
+
+@dataclass(frozen=True, slots=True)
+class OutboxEntry:
+    """待私聊发送的兑换码"""
+    id: int
+    qq_id: int
+    item_name: str
+    cost: int
+    code: str
+    attempts: int = 0
+
+@dataclass(frozen=True, slots=True)
+class MemberDeparture:
+    """待合并处理的退群事件"""
+    user_id: int
+    operator_id: int | None
+    sub_type: str | None
+
 @register("checkin_plugin_pro", "Future-404", "一个为群组设计的、功能强大的激励与奖励系统。集成了高度可配置的每日签到和多商品“GlowMind积分商城”兑换商店。", "6.0.0")
 class CheckinPluginPro(Star):
     # --- 常量定义 ---
-    TABLE_USERS = "users"
-    TABLE_CODES = "codes"
-    TABLE_WHITELIST = "whitelisted_groups"
+    PLUGIN_NAME = "checkin_plugin_pro"
     MAX_ITEM_SLOTS = 10
+    MAX_CODE_LENGTH = 255
+    LEADERBOARD_CACHE_SIZE = 100
+    LEADERBOARD_PAGE_SIZE = 10
+    LEADERBOARD_MAX_PAGE = 10_000
+    # “我的排名”需要按索引计数 (代价随名次增长)，结果按用户短暂缓存
+    RANK_CACHE_SIZE = 1000
+    RANK_CACHE_TTL_SECONDS = 30
+    STOCK_FLUSH_SECONDS = 5
+    # 兑换码发送箱重试参数
+    OUTBOX_POLL_SECONDS = 15
+    OUTBOX_LEASE_SECONDS = 60
+    OUTBOX_RETRY_BASE_SECONDS = 30
+    OUTBOX_RETRY_MAX_SECONDS = 1800
+    DB_INIT_RETRY_BASE_SECONDS = 5
+    DB_INIT_RETRY_MAX_SECONDS = 60
+    WHITELIST_RETRY_BASE_SECONDS = 5
+    WHITELIST_RETRY_MAX_SECONDS = 300
+    # 昵称查询缓存
+    NICKNAME_CACHE_SIZE = 1000
+    NICKNAME_CACHE_TTL_SECONDS = 600
+    # 合并公告中最多列出的用户数
+    DEPARTURE_ANNOUNCE_MAX_NAMES = 20
+    # 积分流水：攒够条数或到达间隔时批量写入；内存中最多积压的条数 (数据库长时间不可用时丢弃最旧的)
+    LEDGER_FLUSH_SECONDS = 2
+    LEDGER_FLUSH_SIZE = 500
+    LEDGER_MAX_PENDING = 100_000
+    LEDGER_PAGE_SIZE = 10
+    # 流水编号与 QQ 号均存为 64 位整数，超出的数字无法作为查询参数
+    LEDGER_MAX_ID = 2 ** 63 - 1
+    LEDGER_COMPACT_INTERVAL_SECONDS = 3600
+    LEDGER_COMPACT_BATCH = 5000
+    LEDGER_REASONS = {"first_checkin": "首次签到", "checkin": "签到", "redeem": "兑换", "admin": "管理员调整", "bulk": "批量调整", "import": "导入"}
+    # 用户数据导出：CSV 表头与每次从数据库读取的行数
+    USERS_CSV_HEADER = ("qq_id", "points", "last_checkin")
+    USERS_EXPORT_BATCH_SIZE = 1000
+    USERS_EXPORT_KEEP = 3
 
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
-        self.db_pool = None
+        self.settings = PluginSettings.from_config(config, self.MAX_ITEM_SLOTS)
+        self.storage: StorageBackend | None = None
+        self._db_ready = asyncio.Event()
+        self.metrics = Metrics()
+        # 白名单群组的进程内缓存，避免每条指令都查询数据库
+        self._whitelist: set[int] = set()
+        self._whitelist_loaded_at = None
+        self._whitelist_lock = asyncio.Lock()
+        self._whitelist_refresh_task: asyncio.Task | None = None
+        self._whitelist_retry_at = 0.0
+        self._whitelist_retry_delay = 0
+        # 当日已签到用户集合，只记录确认过的签到，跨日自动清空
+        self._checked_in_today: set[str] = set()
+        self._checked_in_date = None
+        # 积分排行榜前 N 名缓存，随积分变动增量维护
+        self._leaderboard = TopNCache(self.LEADERBOARD_CACHE_SIZE)
+        self._leaderboard_load_lock = asyncio.Lock()
+        self._rank_cache = TTLCache(self.RANK_CACHE_SIZE, self.RANK_CACHE_TTL_SECONDS)
+        # 各商品库存计数：内存中实时维护，兑换产生的增量定期写回 item_stock 表
+        self._stock_counts: dict[str, int] = {}
+        self._stock_pending_deltas: dict[str, int] = {}
+        # 校准进行中时记录期间发生的库存变动，校准完成后叠加到实际数量上
+        self._stock_reconcile_deltas: dict[str, int] | None = None
+        # 兑换码导入与库存校准互斥：导入的数量要么已计入校准结果，要么在校准之后再累加
+        self._stock_import_lock = asyncio.Lock()
+        self._stock_loaded = False
+        self._shop_text_cache = None
+        self._background_tasks: list[asyncio.Task] = []
+        # 兑换码私聊发送箱：兑换事务内落库，由后台任务限速、重试发送
+        self._bot_client = None
+        self._outbox_queue: asyncio.Queue[OutboxEntry] = asyncio.Queue()
+        self._outbox_inflight: set[int] = set()
+        self._outbox_tasks: set[asyncio.Task] = set()
+        self._outbox_semaphore = asyncio.Semaphore(self.settings.delivery_concurrency)
+        self._outbox_rate_lock = asyncio.Lock()
+        self._outbox_next_send_at = 0.0
+        # 退群事件按群在短时间窗口内合并，批量删除数据并发送一条公告
+        self._pending_departures: dict[int, list[MemberDeparture]] = {}
+        self._departure_tasks: set[asyncio.Task] = set()
+        self._nickname_cache = TTLCache(self.NICKNAME_CACHE_SIZE, self.NICKNAME_CACHE_TTL_SECONDS)
+        # 积分流水：热路径只追加到内存，由后台任务批量写入 points_ledger 表
+        self._ledger_pending: list[tuple] = []
+        self._ledger_wakeup = asyncio.Event()
+        self._ledger_flush_lock = asyncio.Lock()
         logger.info("GlowMind积分商城签到插件 V6.0.0 正在加载 (重构版)...")
-        asyncio.create_task(self.initialize_database())
+        self._init_task = asyncio.create_task(self._start_database())
 
-    async def initialize_database(self):
+    async def _start_database(self):
+        """初始化数据库直至成功 (失败时指数退避重试)，随后开放就绪闸门并启动后台任务。"""
+        delay = self.DB_INIT_RETRY_BASE_SECONDS
+        while True:
+            try:
+                await self.initialize_database()
+                break
+            except Exception as e:
+                logger.error(f"数据库初始化(配置驱动)失败，{delay} 秒后重试: {e}", exc_info=True)
+                if self.storage:
+                    await self.storage.close()
+                    self.storage = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.DB_INIT_RETRY_MAX_SECONDS)
+
+        self._db_ready.set()
+        logger.info("数据库已就绪。")
+        self._background_tasks.append(asyncio.create_task(self._stock_maintenance_loop()))
+        self._background_tasks.append(asyncio.create_task(self._outbox_worker()))
+        self._background_tasks.append(asyncio.create_task(self._ledger_writer_loop()))
+        if self.settings.ledger_retention_days > 0:
+            self._background_tasks.append(asyncio.create_task(self._ledger_compaction_loop()))
+        if self.settings.metrics_log_interval_seconds > 0:
+            self._background_tasks.append(asyncio.create_task(self._metrics_log_loop()))
+
+    async def wait_until_ready(self) -> bool:
+        """等待数据库就绪，最多等待 database.ready_timeout 秒。"""
+        if self._db_ready.is_set():
+            return True
         try:
-            db_conf = self.config.get('database', {})
-            self.db_pool = await aiomysql.create_pool(
-                host=db_conf.get('host'), port=db_conf.get('port'), user=db_conf.get('user'),
-                password=db_conf.get('password'), db=db_conf.get('db_name'), autocommit=True
-            )
-            logger.info("数据库连接池(配置驱动)创建成功。")
-            
-            await self._execute_query(f"""
-                CREATE TABLE IF NOT EXISTS {self.TABLE_USERS} (
-                    qq_id BIGINT PRIMARY KEY, points INT DEFAULT 0, last_checkin DATE
-                );
-                """)
-            await self._execute_query(f"""
-                CREATE TABLE IF NOT EXISTS {self.TABLE_CODES} (
-                    id INT AUTO_INCREMENT PRIMARY KEY, code VARCHAR(255) NOT NULL,
-                    item_type VARCHAR(255) NOT NULL,
-                    UNIQUE (code)
-                );
-                """)
-            await self._execute_query(f"CREATE TABLE IF NOT EXISTS {self.TABLE_WHITELIST} (group_id BIGINT PRIMARY KEY);")
-
-            logger.info("数据库表初始化检查完成。")
-        except Exception as e:
-            logger.error(f"数据库初始化(配置驱动)失败: {e}", exc_info=True)
+            await asyncio.wait_for(self._db_ready.wait(), self.settings.db_ready_timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("数据库尚未就绪，已放弃处理本条消息。")
+            return False
 
-    # --- 数据库辅助核心 ---
-    async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
-        """
-        统一的数据库执行器。
-        :param query: SQL 查询语句
-        :param args: 查询参数
-        :param fetch: 'one' (fetchone), 'all' (fetchall), None (不 fetch, 返回 rowcount)
-        """
-        if not self.db_pool:
-            logger.error("数据库连接池未初始化，无法执行查询。")
-            return None
-        async with self.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, args)
-                if fetch == 'one':
-                    return await cur.fetchone()
-                elif fetch == 'all':
-                    return await cur.fetchall()
-                return cur.rowcount
+    async def initialize_database(self):
+        db_conf = self.config.get('database', {})
+        self.storage = create_storage(
+            db_conf, self.metrics, lambda: os.path.join(StarTools.get_data_dir(self.PLUGIN_NAME), "checkin.db")
+        )
+        logger.info(f"使用 {self.storage.name} 存储后端。")
+        await self.storage.open()
+
+        await self._refresh_whitelist()
+
+        # 先用计数表快速提供库存，再由后台任务按实际数量校准
+        await self._load_stock()
+
+    async def terminate(self):
+        # 未发送完的兑换码仍在发送箱中，下次启动后会继续发送
+        tasks = [self._init_task] + self._background_tasks + list(self._outbox_tasks) + list(self._departure_tasks)
+        if self._whitelist_refresh_task:
+            tasks.append(self._whitelist_refresh_task)
+        # 取得流水写入锁后再取消：写入中的流水批次 (及退群清理) 先完成，不会被中途取消而丢失
+        async with self._ledger_flush_lock:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._background_tasks.clear()
+        if self.storage:
+            # 窗口内尚未处理的退群事件：只清理数据，不再发送公告
+            for group_id in list(self._pending_departures):
+                await self._flush_departures(group_id, announce=False)
+            try:
+                await self._flush_stock_deltas()
+            except Exception as e:
+                logger.error(f"写回库存计数失败: {e}", exc_info=True)
+            try:
+                await self._flush_ledger()
+            except Exception as e:
+                logger.error(f"写入 {len(self._ledger_pending)} 条积分流水失败: {e}", exc_info=True)
+            await self.storage.close()
+            self.storage = None
 
     # --- 辅助核心：静态商品栏搜索引擎 ---
-    def _find_item_by_name(self, name_to_find: str):
-        name_to_find = name_to_find.strip().lower()
-        for i in range(1, self.MAX_ITEM_SLOTS + 1):
-            slot_config = self.config.get(f'item_slot_{i}', {})
-            if slot_config.get('enabled') and slot_config.get('item_name', '').strip().lower() == name_to_find:
-                return {
-                    "internal_id": f'item_slot_{i}',
-                    "item_name": slot_config.get('item_name'),
-                    "item_cost": slot_config.get('item_cost')
-                }
-        return None
+    def _find_item_by_name(self, name_to_find: str) -> CatalogItem | None:
+        return self.settings.items_by_name.get(PluginSettings.normalize_name(name_to_find))
 
     # --- 核心用户功能 ---
     @filter.regex(r"^签到$")
     @require_whitelisted_group
+    @instrumented_handler("handle_checkin")
     async def handle_checkin(self, event: AstrMessageEvent):
         user_id, user_name = event.get_sender_id(), event.get_sender_name()
         
-        general_conf = self.config.get('general_settings', {})
-        offset_hours = general_conf.get('timezone_offset_hours', 8.0)
-        utc_now = datetime.now(timezone.utc)
-        our_timezone = timezone(timedelta(hours=offset_hours))
-        our_now = utc_now.astimezone(our_timezone)
-        today = our_now.date()
-
-        rewards_conf = self.config.get('rewards', {})
-        
-        query = f"SELECT points, last_checkin FROM {self.TABLE_USERS} WHERE qq_id = %s"
-        result = await self._execute_query(query, (user_id,), fetch='one')
+        settings = self.settings
+        today = datetime.now(settings.tz).date()
 
-        if result and result[1] == today:
+        if self._checked_in_date != today:
+            self._checked_in_today = set()
+            self._checked_in_date = today
+        if str(user_id) in self._checked_in_today:
             yield event.plain_result(f"{user_name}，你今天已经签过到了哦，明天再来吧！")
             return
-        
-        if result is None:
-            final_points = rewards_conf.get('first_checkin_points', 20)
-            reply_message = f"欢迎新朋友 {user_name}！首次签到获得特别奖励，获得 {final_points} 积分！"
-            insert_query = f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (%s, %s, %s)"
-            await self._execute_query(insert_query, (user_id, final_points, today))
+
+        # 预先掷出老用户的奖励，使签到只需一条语句完成
+        first_points = settings.first_checkin_points
+        base_points = random.randint(settings.min_points, settings.max_points)
+        is_crit = random.random() < settings.crit_chance
+        final_points = base_points * 2 if is_crit else base_points
+
+        outcome, new_points = await self.storage.checkin(user_id, first_points, today, final_points)
+
+        if outcome in (CHECKIN_NEW, CHECKIN_UPDATED):
+            if new_points is not None:
+                self._leaderboard.update(user_id, new_points)
+            else:
+                # 未能取得新积分时移出缓存，仍满足排行榜缓存的不变式
+                self._leaderboard.remove(user_id)
+        # 查询期间若已跨日，则不把结果记入新一天的集合
+        if self._checked_in_date == today:
+            self._checked_in_today.add(str(user_id))
+        if outcome not in (CHECKIN_NEW, CHECKIN_UPDATED):
+            yield event.plain_result(f"{user_name}，你今天已经签过到了哦，明天再来吧！")
+            return
+
+        if outcome == CHECKIN_NEW:
+            self._record_ledger(user_id, first_points, "first_checkin")
+            reply_message = f"欢迎新朋友 {user_name}！首次签到获得特别奖励，获得 {first_points} 积分！"
         else:
-            base_points = random.randint(rewards_conf.get('min_points', 5), rewards_conf.get('max_points', 15))
-            final_points = base_points
-            is_crit = random.random() < rewards_conf.get('crit_chance', 0.05)
-            
+            self._record_ledger(user_id, final_points, "checkin")
             reply_message = f"{user_name} 签到成功！\n获得了 {base_points} 点基础积分"
             if is_crit:
-                final_points *= 2
                 reply_message += f"，🤑触发幸运翻倍！\n最终获得 {final_points} 积分！"
             else:
                 reply_message += "."
-            
-            update_query = f"UPDATE {self.TABLE_USERS} SET points = points + %s, last_checkin = %s WHERE qq_id = %s"
-            await self._execute_query(update_query, (final_points, today, user_id))
         
         yield event.plain_result(reply_message)
 
     @filter.regex(r"^积分$")
     @require_whitelisted_group
+    @instrumented_handler("query_points")
     async def query_points(self, event: AstrMessageEvent):
         user_id, user_name = event.get_sender_id(), event.get_sender_name()
-        query = f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s"
-        result = await self._execute_query(query, (user_id,), fetch='one')
-        points = (result or [0])[0]
+        points = await self.storage.get_points(user_id) or 0
         yield event.plain_result(f"{user_name}，您好！\n通过每日签到，您已累计了 {points} 积分。")
 
-    async def _get_all_inventory_counts(self):
-        inventory_counts = {}
-        query = f"SELECT item_type, COUNT(*) FROM {self.TABLE_CODES} GROUP BY item_type"
-        results = await self._execute_query(query, fetch='all')
-        if results:
-            inventory_counts = {row[0]: row[1] for row in results}
-        return inventory_counts
+    # --- 积分排行 ---
+    async def _load_leaderboard(self):
+        """按 idx_users_points 索引读取前 N 名重建排行榜缓存；查询期间的积分变动由缓存记录并在载入后重放。"""
+        cache = self._leaderboard
+        cache.begin_load()
+        try:
+            rows = await self.storage.top_users(cache.capacity, label="leaderboard_load")
+        except BaseException:
+            cache.cancel_load()
+            raise
+        cache.load(rows)
+
+    async def _get_leaderboard_page(self, page: int) -> list:
+        offset = (page - 1) * self.LEADERBOARD_PAGE_SIZE
+        needed = offset + self.LEADERBOARD_PAGE_SIZE
+        cache = self._leaderboard
+        if needed <= cache.capacity or cache.complete:
+            if not cache.covers(needed):
+                # 并发的浏览请求共用一次载入
+                async with self._leaderboard_load_lock:
+                    if not cache.covers(needed):
+                        await self._load_leaderboard()
+            if cache.covers(needed):
+                return cache.page(offset, self.LEADERBOARD_PAGE_SIZE)
+
+        # 超出缓存范围的页直接走索引查询
+        return await self.storage.top_users(self.LEADERBOARD_PAGE_SIZE, offset)
+
+    async def _get_user_rank(self, user_id):
+        """返回 (名次, 积分)，用户不存在时返回 None。排行榜缓存外的用户需按索引计数，结果短暂缓存。"""
+        if self._leaderboard.loaded:
+            cached = self._leaderboard.rank_of(user_id)
+            if cached:
+                return cached
+
+        key = int(user_id)
+        cached = self._rank_cache.get(key)
+        if cached is not None:
+            return cached or None
+        points = await self.storage.get_points(user_id, label="rank_points")
+        rank = (await self.storage.count_users_ahead(user_id, points) + 1, points) if points is not None else ()
+        self._rank_cache.set(key, rank)
+        return rank or None
+
+    @filter.regex(r"^积分排行\s*\d*$")
+    @require_whitelisted_group
+    @instrumented_handler("show_leaderboard")
+    async def show_leaderboard(self, event: AstrMessageEvent):
+        user_id, user_name = event.get_sender_id(), event.get_sender_name()
+        page_text = event.message_str.strip()[4:].strip()
+        page = max(1, _clamp_digits(page_text, self.LEADERBOARD_MAX_PAGE + 1))
+        if page > self.LEADERBOARD_MAX_PAGE:
+            yield event.plain_result(f"积分排行榜最多只能翻到第 {self.LEADERBOARD_MAX_PAGE} 页。")
+            return
+
+        rows = await self._get_leaderboard_page(page)
+        if not rows:
+            yield event.plain_result("当前还没有人上榜哦，快去签到吧！" if page == 1 else f"积分排行榜没有第 {page} 页。")
+            return
+
+        offset = (page - 1) * self.LEADERBOARD_PAGE_SIZE
+        lines = [f"🏆 积分排行榜 (第 {page} 页)"]
+        lines.extend(f"{offset + index}. {qq_id} — {points} 积分" for index, (qq_id, points) in enumerate(rows, 1))
+
+        # 只用排行榜缓存回答“我的名次”，翻看排行榜不产生额外查询
+        cache = self._leaderboard
+        my_rank = cache.rank_of(user_id) if cache.loaded else None
+        if my_rank:
+            lines.append(f"\n{user_name}，你当前排名第 {my_rank[0]} 位，共 {my_rank[1]} 积分。")
+        elif cache.loaded and cache.complete:
+            lines.append(f"\n{user_name}，你还没有积分记录，签到后即可上榜。")
+        else:
+            lines.append(f"\n{user_name}，你暂未进入前 {cache.capacity} 名，发送“我的排名”可查看当前名次。")
+        yield event.plain_result("\n".join(lines))
+
+    @filter.regex(r"^我的排名$")
+    @require_whitelisted_group
+    @instrumented_handler("show_my_rank")
+    async def show_my_rank(self, event: AstrMessageEvent):
+        user_id, user_name = event.get_sender_id(), event.get_sender_name()
+        my_rank = await self._get_user_rank(user_id)
+        if my_rank:
+            yield event.plain_result(f"{user_name}，你当前排名第 {my_rank[0]} 位，共 {my_rank[1]} 积分。")
+        else:
+            yield event.plain_result(f"{user_name}，你还没有积分记录，签到后即可上榜。")
+
+    # --- 库存计数 ---
+    def _adjust_stock(self, item_type: str, delta: int, persist: bool = False):
+        """更新内存库存；persist 为 True 时记录增量，由后台任务批量写回计数表。"""
+        if not delta:
+            return
+        # 不在此截断到 0：兑换可能先于导入的累加完成，截断会丢掉这次扣减；展示时再截断
+        self._stock_counts[item_type] = self._stock_counts.get(item_type, 0) + delta
+        if self._stock_reconcile_deltas is not None:
+            self._stock_reconcile_deltas[item_type] = self._stock_reconcile_deltas.get(item_type, 0) + delta
+        if persist:
+            self._stock_pending_deltas[item_type] = self._stock_pending_deltas.get(item_type, 0) + delta
+        self._shop_text_cache = None
+
+    async def _load_stock(self) -> bool:
+        """从计数表加载库存，计数表为空时返回 False。"""
+        counts = await self.storage.load_stock()
+        if not counts:
+            return False
+        self._stock_counts = counts
+        self._stock_loaded = True
+        self._shop_text_cache = None
+        return True
+
+    async def _reconcile_stock(self):
+        """按 codes 表的实际数量校准计数表和内存计数。"""
+        async with self._stock_import_lock:
+            # 计数表将按实际数量重写，此前未写回的增量随之作废；校准期间新产生的增量 (兑换) 仍需写回
+            discarded, self._stock_pending_deltas = self._stock_pending_deltas, {}
+            self._stock_reconcile_deltas = {}
+            try:
+                counts = await self.storage.reconcile_stock()
+            except BaseException:
+                for item_type, delta in discarded.items():
+                    self._stock_pending_deltas[item_type] = self._stock_pending_deltas.get(item_type, 0) + delta
+                raise
+            finally:
+                during, self._stock_reconcile_deltas = self._stock_reconcile_deltas, None
+
+        # 在校准提交前完成的兑换可能已计入实际数量，此处会多扣一次，下次校准时修正
+        for item_type, delta in during.items():
+            counts[item_type] = counts.get(item_type, 0) + delta
+        if counts != self._stock_counts:
+            logger.info(f"库存计数已校准: {counts}")
+        self._stock_counts = counts
+        self._stock_loaded = True
+        self._shop_text_cache = None
+
+    async def _flush_stock_deltas(self):
+        """将兑换产生的库存增量写回计数表。"""
+        if not self._stock_pending_deltas:
+            return
+        deltas, self._stock_pending_deltas = self._stock_pending_deltas, {}
+        for item_type, delta in deltas.items():
+            if not delta:
+                continue
+            try:
+                await self.storage.add_stock(item_type, delta)
+            except Exception:
+                self._stock_pending_deltas[item_type] = self._stock_pending_deltas.get(item_type, 0) + delta
+                raise
+
+    async def _stock_maintenance_loop(self):
+        """后台任务：定期写回库存增量，并按配置间隔校准库存。启动后会先校准一次。"""
+        last_reconcile = None
+        while True:
+            try:
+                await self._flush_stock_deltas()
+                reconcile_seconds = self.settings.stock_reconcile_seconds
+                if last_reconcile is None or (reconcile_seconds > 0 and time.monotonic() - last_reconcile >= reconcile_seconds):
+                    await self._reconcile_stock()
+                    last_reconcile = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"库存计数维护失败: {e}", exc_info=True)
+            await asyncio.sleep(self.STOCK_FLUSH_SECONDS)
+
+    def _render_shop_text(self) -> str:
+        parts = ["欢迎光临1781积分商城！\n当前可兑换的秘宝有：\n"]
+
+        for item in self.settings.items:
+            item_cost = item.item_cost if item.item_cost is not None else '未知'
+            stock = max(0, self._stock_counts.get(item.internal_id, 0))
+
+            parts.append(f"\n💎 **{item.item_name}**\n")
+            parts.append(f"   - 价格: {item_cost} 积分\n")
+            parts.append(f"   -库存: {stock} 件")
+
+        if not self.settings.items:
+            return "GlowMind积分商城今日正在盘点，暂无商品上架，敬请期待！"
+        return "".join(parts)
 
     @filter.regex(r"^(商|阁楼)$")
     @require_whitelisted_group
+    @instrumented_handler("show_redeemable_items")
     async def show_redeemable_items(self, event: AstrMessageEvent):
-        inventory_counts = await self._get_all_inventory_counts()
-        reply_text = "欢迎光临1781积分商城！\n当前可兑换的秘宝有：\n"
-        found_any = False
-
-        for i in range(1, self.MAX_ITEM_SLOTS + 1):
-            slot_config = self.config.get(f'item_slot_{i}', {})
-            
-            if slot_config.get('enabled') and slot_config.get('item_name'):
-                found_any = True
-                item_name = slot_config.get('item_name')
-                item_cost = slot_config.get('item_cost', '未知')
-                internal_id = f'item_slot_{i}'
-                stock = inventory_counts.get(internal_id, 0)
-
-                reply_text += f"\n💎 **{item_name}**\n"
-                reply_text += f"   - 价格: {item_cost} 积分\n"
-                reply_text += f"   -库存: {stock} 件"
-
-        if not found_any:
-            reply_text = "GlowMind积分商城今日正在盘点，暂无商品上架，敬请期待！"
-        yield event.plain_result(reply_text)
+        if not self._stock_loaded:
+            await self._reconcile_stock()
+        # 渲染结果缓存到库存变化为止；商品配置修改后插件会重新加载，缓存随之失效
+        if self._shop_text_cache is None:
+            self._shop_text_cache = self._render_shop_text()
+        yield event.plain_result(self._shop_text_cache)
 
     @filter.regex(r"^兑换\s*.+")
     @require_whitelisted_group
+    @instrumented_handler("redeem_item")
     async def redeem_item(self, event: AstrMessageEvent):
         full_message = event.message_str.strip()
         item_name_to_redeem = full_message[2:].strip()
@@ -201,166 +639,492 @@ class CheckinPluginPro(Star):
             yield event.plain_result(f"抱歉，GlowMind积分商城中没有名为“{item_name_to_redeem}”的商品。")
             return
 
-        item_name = target_item.get('item_name')
-        internal_id = target_item.get('internal_id')
-        cost = target_item.get('item_cost', 99999)
-        the_code = "" # 初始化
+        item_name = target_item.item_name
+        internal_id = target_item.internal_id
+        cost = target_item.item_cost if target_item.item_cost is not None else 99999
 
-        # --- 事务开始 ---
-        async with self.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                try:
-                    await conn.begin()
-
-                    # 1. 锁定并检查用户积分
-                    await cur.execute(f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s FOR UPDATE", (user_id,))
-                    current_points_result = await cur.fetchone()
-                    
-                    current_points = (current_points_result or [0])[0]
-
-                    if current_points < cost:
-                        yield event.plain_result(f"{user_name}，您的积分不足 {cost}，无法兑换【{item_name}】。")
-                        await conn.rollback()
-                        return
-
-                    # 2. 锁定并获取一个兑换码
-                    await cur.execute(f"SELECT id, code FROM {self.TABLE_CODES} WHERE item_type = %s LIMIT 1 FOR UPDATE", (internal_id,))
-                    code_record = await cur.fetchone()
-
-                    if not code_record:
-                        yield event.plain_result(f"抱歉，【{item_name}】的库存已空。")
-                        await conn.rollback()
-                        return
-                    
-                    code_id, the_code = code_record
-
-                    # 3. 扣除积分
-                    await cur.execute(f"UPDATE {self.TABLE_USERS} SET points = points - %s WHERE qq_id = %s", (cost, user_id))
-                    
-                    # 4. 删除已使用的兑换码
-                    await cur.execute(f"DELETE FROM {self.TABLE_CODES} WHERE id = %s", (code_id,))
-
-                    # 5. 提交事务
-                    await conn.commit()
+        transaction_start = time.perf_counter()
+        try:
+            result = await self.storage.redeem(user_id, internal_id, item_name, cost)
+        except Exception as e:
+            logger.error(f"用户 {user_id} 兑换【{item_name}】时发生数据库事务错误: {e}", exc_info=True)
+            yield event.plain_result(f"兑换失败，发生意外的数据库错误，请联系管理员。")
+            return
+
+        if result.status == REDEEM_INSUFFICIENT_POINTS:
+            yield event.plain_result(f"{user_name}，您的积分不足 {cost}，无法兑换【{item_name}】。")
+            return
+        if result.status == REDEEM_OUT_OF_STOCK:
+            yield event.plain_result(f"抱歉，【{item_name}】的库存已空。")
+            return
+
+        self.metrics.observe("transaction", "redeem", time.perf_counter() - transaction_start)
+        self._adjust_stock(internal_id, -1, persist=True)
+        self._record_ledger(user_id, -cost, "redeem", item_name)
+        if result.points is not None:
+            self._leaderboard.update(user_id, result.points - cost)
+
+        # 事务成功后交给后台发送私信，群内回复无需等待私聊结果
+        self._bot_client = event.bot
+        self._outbox_queue.put_nowait(OutboxEntry(result.outbox_id, int(user_id), item_name, cost, result.code))
+        yield event.plain_result(f"恭喜 {user_name}！兑换【{item_name}】成功，秘宝将通过私聊发送，请留意私信！")
+
+    # --- 积分流水 ---
+    def _record_ledger(self, user_id, delta: int, reason: str, item: str | None = None):
+        """记录一条积分变动，由后台任务批量写入。"""
+        if not delta:
+            return
+        self._ledger_pending.append((int(user_id), delta, reason, item, int(time.time())))
+        if len(self._ledger_pending) >= self.LEDGER_FLUSH_SIZE:
+            self._ledger_wakeup.set()
+
+    async def _flush_ledger(self):
+        """写入积压的积分流水；已有批次在写入时先等待其完成。"""
+        async with self._ledger_flush_lock:
+            if not self._ledger_pending:
+                return
+            entries, self._ledger_pending = self._ledger_pending, []
+            try:
+                await self.storage.append_ledger(entries)
+            except Exception:
+                # 放回队首等待下次重试，积压过多时丢弃最旧的流水
+                self._ledger_pending[:0] = entries
+                overflow = len(self._ledger_pending) - self.LEDGER_MAX_PENDING
+                if overflow > 0:
+                    del self._ledger_pending[:overflow]
+                    self.metrics.incr("ledger_dropped", overflow)
+                    logger.warning(f"积分流水积压过多，已丢弃最早的 {overflow} 条。")
+                raise
+            self.metrics.peak("ledger_batch", len(entries))
+
+    async def _ledger_writer_loop(self):
+        """后台任务：积攒积分流水，攒够 LEDGER_FLUSH_SIZE 条或每隔 LEDGER_FLUSH_SECONDS 秒批量写入一次。"""
+        while True:
+            try:
+                await asyncio.wait_for(self._ledger_wakeup.wait(), self.LEDGER_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._ledger_wakeup.clear()
+            try:
+                await self._flush_ledger()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"写入积分流水失败，稍后重试: {e}", exc_info=True)
+
+    async def _compact_ledger(self) -> int:
+        """将超过保留天数的流水合并进各用户的汇总，返回合并的条数。"""
+        before = int(time.time()) - self.settings.ledger_retention_days * 86400
+        total = 0
+        while True:
+            compacted = await self.storage.compact_ledger(before, self.LEDGER_COMPACT_BATCH)
+            total += compacted
+            if compacted < self.LEDGER_COMPACT_BATCH:
+                return total
+            # 分批提交，批次之间让出事件循环与数据库
+            await asyncio.sleep(0)
 
+    async def _ledger_compaction_loop(self):
+        """后台任务：启动后及每隔 LEDGER_COMPACT_INTERVAL_SECONDS 秒合并一次旧流水。"""
+        while True:
+            try:
+                compacted = await self._compact_ledger()
+                if compacted:
+                    logger.info(f"已将 {compacted} 条超过 {self.settings.ledger_retention_days} 天的积分流水合并为汇总。")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"合并积分流水失败: {e}", exc_info=True)
+            await asyncio.sleep(self.LEDGER_COMPACT_INTERVAL_SECONDS)
+
+    async def _render_ledger_page(self, user_id, before_id: int, title: str, next_command: str) -> str:
+        # 多取一条用于判断是否还有下一页
+        rows = await self.storage.ledger_page(user_id, before_id or None, self.LEDGER_PAGE_SIZE + 1)
+        has_more = len(rows) > self.LEDGER_PAGE_SIZE
+        rows = rows[:self.LEDGER_PAGE_SIZE]
+
+        tz = self.settings.tz
+        lines = [title]
+        for ledger_id, delta, reason, item, created_at in rows:
+            reason_text = self.LEDGER_REASONS.get(reason, reason)
+            if item:
+                reason_text += f"【{item}】"
+            lines.append(f"#{ledger_id} {datetime.fromtimestamp(created_at, tz):%m-%d %H:%M} {reason_text} {delta:+d}")
+
+        if has_more:
+            lines.append(f"\n发送“{next_command} {rows[-1][0]}”查看更早的记录。")
+            return "\n".join(lines)
+
+        summary = await self.storage.ledger_summary(user_id)
+        if summary:
+            delta_total, entries, last_at = summary
+            lines.append(f"更早的 {entries} 条记录已合并，合计 {delta_total:+d} 积分 (截至 {datetime.fromtimestamp(last_at, tz):%Y-%m-%d})。")
+        if len(lines) == 1:
+            lines.append("暂无积分变动记录。" if not before_id else "没有更早的记录了。")
+        return "\n".join(lines)
+
+    @filter.regex(r"^积分明细\s*\d*$")
+    @require_whitelisted_group
+    @instrumented_handler("ledger_history")
+    async def show_ledger_history(self, event: AstrMessageEvent):
+        """查看自己的积分变动记录；附带记录编号时从该条之前继续翻页。"""
+        user_id, user_name = event.get_sender_id(), event.get_sender_name()
+        before_text = event.message_str.strip()[4:].strip()
+        before_id = _clamp_digits(before_text, self.LEDGER_MAX_ID)
+        yield event.plain_result(await self._render_ledger_page(user_id, before_id, f"📜 {user_name} 的积分明细", "积分明细"))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("查询积分明细")
+    @require_database_ready
+    async def show_user_ledger_history(self, event: AstrMessageEvent, user_id: int, before_id: int = 0):
+        """管理员查看指定用户的积分变动记录。"""
+        if not 0 < user_id <= self.LEDGER_MAX_ID:
+            yield event.plain_result(f"QQ号 {user_id} 无效。")
+            return
+        before_id = min(max(before_id, 0), self.LEDGER_MAX_ID)
+        yield event.plain_result(await self._render_ledger_page(
+            user_id, before_id, f"📜 用户 {user_id} 的积分明细", f"/查询积分明细 {user_id}"
+        ))
+
+    # --- 兑换码发送箱 ---
+    def _get_bot_client(self):
+        if self._bot_client is None:
+            # 重启后尚未收到任何消息时，从平台适配器获取客户端
+            platform = self.context.get_platform(filter.PlatformAdapterType.AIOCQHTTP)
+            if platform:
+                self._bot_client = platform.get_client()
+        return self._bot_client
+
+    async def _load_due_outbox(self) -> list[OutboxEntry]:
+        limit = self.settings.delivery_concurrency * 20
+        rows = await self.storage.load_due_outbox(int(time.time()), limit)
+        return [OutboxEntry(*row) for row in rows]
+
+    async def _outbox_worker(self):
+        """后台任务：发送新兑换的兑换码，并定期捞取到期需要重试的记录。"""
+        last_poll = None
+        while True:
+            try:
+                entries = []
+                if last_poll is None or time.monotonic() - last_poll >= self.OUTBOX_POLL_SECONDS:
+                    entries = await self._load_due_outbox()
+                    last_poll = time.monotonic()
+                else:
+                    try:
+                        timeout = self.OUTBOX_POLL_SECONDS - (time.monotonic() - last_poll)
+                        entries.append(await asyncio.wait_for(self._outbox_queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        continue
+                while not self._outbox_queue.empty():
+                    entries.append(self._outbox_queue.get_nowait())
+
+                for entry in entries:
+                    if entry.id in self._outbox_inflight:
+                        continue
+                    self._outbox_inflight.add(entry.id)
+                    task = asyncio.create_task(self._deliver_outbox_entry(entry))
+                    self._outbox_tasks.add(task)
+                    task.add_done_callback(self._outbox_tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"兑换码发送箱处理失败: {e}", exc_info=True)
+                await asyncio.sleep(self.OUTBOX_POLL_SECONDS)
+
+    async def _outbox_throttle(self):
+        """按 delivery_rate_per_second 限制私聊发送速率。"""
+        rate = self.settings.delivery_rate_per_second
+        if rate <= 0:
+            return
+        async with self._outbox_rate_lock:
+            now = time.monotonic()
+            wait = self._outbox_next_send_at - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._outbox_next_send_at = max(now, self._outbox_next_send_at) + 1 / rate
+
+    async def _deliver_outbox_entry(self, entry: OutboxEntry):
+        try:
+            async with self._outbox_semaphore:
+                # 领取记录：同一条记录被队列和轮询同时取到时只会发送一次；
+                # 发送中途进程退出的记录在租约到期后会被重新领取
+                now = int(time.time())
+                if not await self.storage.claim_outbox(entry.id, now, now + self.OUTBOX_LEASE_SECONDS):
+                    return
+                await self._outbox_throttle()
+                try:
+                    client = self._get_bot_client()
+                    if client is None:
+                        raise RuntimeError("aiocqhttp 平台尚未就绪")
+                    with self.metrics.timer("delivery", "send_private_msg"):
+                        await client.send_private_msg(
+                            user_id=entry.qq_id,
+                            message=f"您好！您成功使用 {entry.cost} 积分兑换了【{entry.item_name}】，请查收：\n{entry.code}"
+                        )
                 except Exception as e:
-                    await conn.rollback()
-                    logger.error(f"用户 {user_id} 兑换【{item_name}】时发生数据库事务错误: {e}", exc_info=True)
-                    yield event.plain_result(f"兑换失败，发生意外的数据库错误，请联系管理员。")
+                    self.metrics.incr("delivery_failed")
+                    await self._mark_outbox_failed(entry, e)
                     return
-        # --- 事务结束 ---
+                self.metrics.incr("delivery_sent")
+                # 发送成功后删除记录；删除失败时会在之后重发，宁可重复也不丢失
+                await self.storage.delete_outbox(entry.id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"更新发送箱记录 {entry.id} 失败: {e}", exc_info=True)
+        finally:
+            self._outbox_inflight.discard(entry.id)
+
+    async def _mark_outbox_failed(self, entry: OutboxEntry, error: Exception):
+        attempts = entry.attempts + 1
+        final = attempts >= self.settings.delivery_max_attempts
+        if final:
+            next_attempt_at = 0
+            logger.error(
+                f"兑换码私聊发送失败 {attempts} 次，已停止重试 (发送箱 #{entry.id}，用户 {entry.qq_id}，"
+                f"【{entry.item_name}】)，可使用 /补发兑换码 重新发送: {error}"
+            )
+        else:
+            delay = min(self.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), self.OUTBOX_RETRY_MAX_SECONDS)
+            next_attempt_at = int(time.time()) + delay
+            logger.warning(f"兑换码私聊发送失败 (发送箱 #{entry.id}，用户 {entry.qq_id})，{delay} 秒后重试: {error}")
+        await self.storage.mark_outbox_failed(entry.id, attempts, next_attempt_at, str(error), final)
+
+    # --- 性能统计 ---
+    def _format_metrics_report(self) -> str:
+        report = self.metrics.format_report()
+        if self.storage and self.storage.status_text():
+            report += f"\n\n{self.storage.status_text()}"
+        report += f"\n[发送箱] 待发送队列 {self._outbox_queue.qsize()}，发送中 {len(self._outbox_inflight)}"
+        return report
+
+    async def _metrics_log_loop(self):
+        """后台任务：按 metrics_log_interval_seconds 定期将性能统计写入日志。"""
+        while True:
+            await asyncio.sleep(self.settings.metrics_log_interval_seconds)
+            logger.info(self._format_metrics_report())
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("性能统计")
+    async def show_metrics(self, event: AstrMessageEvent, action: str = ""):
+        if action == "重置":
+            self.metrics.reset()
+            yield event.plain_result("性能统计已重置。")
+            return
+        yield event.plain_result(self._format_metrics_report())
+
+    # --- 辅助与管理功能 ---
+    @staticmethod
+    def _normalize_group_id(group_id):
+        """将群号统一为 int；无效群号返回 None。"""
+        try:
+            return int(group_id)
+        except (TypeError, ValueError):
+            return None
+
+    async def _refresh_whitelist(self, force: bool = True):
+        """从数据库重新加载白名单到内存。"""
+        async with self._whitelist_lock:
+            # 等锁期间可能已被其他协程刷新过
+            if not force and not self._whitelist_is_stale():
+                return
+            self._whitelist = await self.storage.load_whitelist()
+            self._whitelist_loaded_at = time.monotonic()
+            logger.info(f"白名单缓存已加载，共 {len(self._whitelist)} 个群。")
 
-        # 事务成功后，发送私信
+    def _whitelist_is_stale(self) -> bool:
+        if self._whitelist_loaded_at is None:
+            return True
+        refresh_seconds = self.settings.whitelist_refresh_seconds
+        return refresh_seconds > 0 and time.monotonic() - self._whitelist_loaded_at >= refresh_seconds
+
+    async def _refresh_whitelist_in_background(self):
+        """后台刷新白名单；失败时按指数退避推迟下次刷新，期间继续使用旧缓存。"""
         try:
-            client = event.bot
-            await client.send_private_msg(user_id=user_id, message=f"您好！您成功使用 {cost} 积分兑换了【{item_name}】，请查收：\n{the_code}")
-            yield event.plain_result(f"恭喜 {user_name}！兑换【{item_name}】成功，秘宝已通过私聊发送！")
+            await self._refresh_whitelist(force=False)
+            self._whitelist_retry_delay = 0
         except Exception as e:
-            logger.error(f"兑换【{item_name}】私聊发送失败 (但积分和库存已扣除): {e}", exc_info=True)
-            yield event.plain_result(f"@{user_name} 兑换成功！但私聊发送时发生未知错误，请联系管理员并提供此消息截图以补发。")
+            self._whitelist_retry_delay = min(
+                max(self._whitelist_retry_delay * 2, self.WHITELIST_RETRY_BASE_SECONDS), self.WHITELIST_RETRY_MAX_SECONDS
+            )
+            self._whitelist_retry_at = time.monotonic() + self._whitelist_retry_delay
+            logger.error(f"刷新白名单缓存失败，{self._whitelist_retry_delay} 秒后重试: {e}", exc_info=True)
+        finally:
+            self._whitelist_refresh_task = None
 
-    # --- 辅助与管理功能 ---
-    async def is_group_whitelisted(self, group_id: int) -> bool:
+    async def is_group_whitelisted(self, group_id) -> bool:
+        group_id = self._normalize_group_id(group_id)
         if not group_id: return False
-        query = f"SELECT group_id FROM {self.TABLE_WHITELIST} WHERE group_id = %s"
-        result = await self._execute_query(query, (group_id,), fetch='one')
-        return result is not None
+        # 始终用内存缓存作答：过期时只启动一个后台刷新任务，消息处理不等待数据库
+        if (
+            self._whitelist_refresh_task is None
+            and self._whitelist_is_stale()
+            and time.monotonic() >= self._whitelist_retry_at
+        ):
+            self._whitelist_refresh_task = asyncio.create_task(self._refresh_whitelist_in_background())
+        return group_id in self._whitelist
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("添加白名单")
+    @require_database_ready
     async def add_whitelist(self, event: AstrMessageEvent):
-        group_id = event.get_group_id()
+        group_id = self._normalize_group_id(event.get_group_id())
         if not group_id: yield event.plain_result("请在群聊中执行。"); return
         if await self.is_group_whitelisted(group_id): yield event.plain_result("该群已在白名单中。"); return
         
-        query = f"INSERT INTO {self.TABLE_WHITELIST} (group_id) VALUES (%s)"
-        await self._execute_query(query, (group_id,))
+        await self.storage.add_whitelist(group_id)
+        self._whitelist.add(group_id)
         yield event.plain_result(f"成功将群 {group_id} 添加到白名单。")
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("移除白名单")
+    @require_database_ready
     async def remove_whitelist(self, event: AstrMessageEvent):
-        group_id = event.get_group_id()
+        group_id = self._normalize_group_id(event.get_group_id())
         if not group_id: yield event.plain_result("请在群聊中执行。"); return
         if not await self.is_group_whitelisted(group_id): yield event.plain_result("该群不在白名单中。"); return
         
-        query = f"DELETE FROM {self.TABLE_WHITELIST} WHERE group_id = %s"
-        await self._execute_query(query, (group_id,))
+        await self.storage.remove_whitelist(group_id)
+        self._whitelist.discard(group_id)
         yield event.plain_result(f"成功将群 {group_id} 从白名单中移除。")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("补发兑换码")
+    @require_database_ready
+    async def resend_codes(self, event: AstrMessageEvent, user_id: int = 0):
+        """将发送失败的兑换码重新放回发送箱；指定 QQ 号时只处理该用户。"""
+        rows_affected = await self.storage.requeue_failed_outbox(user_id or None)
+        if not rows_affected:
+            yield event.plain_result("没有需要补发的兑换码。")
+            return
+
+        self._bot_client = getattr(event, "bot", None) or self._bot_client
+        for entry in await self._load_due_outbox():
+            self._outbox_queue.put_nowait(entry)
+        target_text = f"用户 {user_id} 的" if user_id else ""
+        yield event.plain_result(f"已将{target_text} {rows_affected} 条发送失败的兑换码重新加入发送队列。")
+
+    async def _find_attached_file(self, event: AstrMessageEvent):
+        """在消息或其引用的消息中查找文件，返回 (本地路径, 是否为临时下载)。"""
+        for component in event.get_messages():
+            candidates = (component.chain or []) if isinstance(component, Reply) else [component]
+            for candidate in candidates:
+                if isinstance(candidate, File):
+                    is_local = bool(candidate.file_) and os.path.exists(candidate.file_)
+                    path = await candidate.get_file()
+                    if path:
+                        return path, not is_local
+        return None, False
+
+    async def _import_codes(self, internal_id: str, lines, batch_size: int, threaded: bool = False):
+        """
+        在单个事务内分批写入兑换码。
+        :param lines: 兑换码行迭代器，按需读取，不会一次性载入内存
+        :param threaded: 为 True 时在线程中读取行 (用于文件)，避免阻塞事件循环
+        :return: (读取数, 新增数, 输入内重复数, 超长无效数)
+        """
+        seen_codes = set()
+        stats = {"total": 0, "input_duplicates": 0, "invalid": 0}
+
+        def clean_batches():
+            # 由存储后端按需推进 (可能在线程中)，统计结果在导入完成后读取
+            while True:
+                raw_batch = _read_code_batch(lines, batch_size)
+                if not raw_batch:
+                    return
+                batch = []
+                for code in raw_batch:
+                    stats["total"] += 1
+                    if len(code) > self.MAX_CODE_LENGTH:
+                        stats["invalid"] += 1
+                    elif code in seen_codes:
+                        stats["input_duplicates"] += 1
+                    else:
+                        seen_codes.add(code)
+                        batch.append(code)
+                if batch:
+                    yield batch
+
+        async with self._stock_import_lock:
+            added_count = await self.storage.import_codes(internal_id, clean_batches(), threaded=threaded)
+            self._adjust_stock(internal_id, added_count)
+
+        return stats["total"], added_count, stats["input_duplicates"], stats["invalid"]
+
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("导入兑换码")
+    @require_database_ready
+    @instrumented_handler("import_codes")
     async def import_codes_command(self, event: AstrMessageEvent, item_name: str):
-        full_message = event.message_str
-        first_newline_index = full_message.find('\n')
-
-        if first_newline_index == -1:
-            yield event.plain_result("请在指令的下一行，提供需要导入的兑换码。")
-            return
-            
-        codes_text = full_message[first_newline_index:].strip()
-        
         target_item = self._find_item_by_name(item_name)
         if not target_item:
             yield event.plain_result(f"导入失败：未找到名为“{item_name}”的商品。")
             return
-        
-        internal_id = target_item.get('internal_id')
-        code_list = [line.strip() for line in codes_text.splitlines() if line.strip()]
 
-        if not code_list:
-            yield event.plain_result("未在指令中找到有效的兑换码。")
+        internal_id = target_item.internal_id
+        batch_size = self.settings.import_batch_size
+
+        full_message = event.message_str
+        first_newline_index = full_message.find('\n')
+        codes_text = full_message[first_newline_index:].strip() if first_newline_index != -1 else ""
+
+        file_path, is_temp_file = None, False
+        if not codes_text:
+            file_path, is_temp_file = await self._find_attached_file(event)
+            if not file_path:
+                yield event.plain_result("请在指令的下一行提供需要导入的兑换码，或随指令附带 (引用) 一个 txt/csv 文件。")
+                return
+
+        try:
+            if file_path:
+                with open(file_path, encoding='utf-8-sig', errors='replace', newline='') as fh:
+                    lines = _iter_code_lines(fh, file_path.lower().endswith('.csv'))
+                    stats = await self._import_codes(internal_id, lines, batch_size, threaded=True)
+            else:
+                stats = await self._import_codes(internal_id, iter(codes_text.splitlines()), batch_size)
+        except Exception as e:
+            logger.error(f"为【{item_name}】导入兑换码时出错: {e}", exc_info=True)
+            yield event.plain_result("导入失败，发生意外错误，本次导入已全部回滚，请检查后重试。")
             return
+        finally:
+            if file_path and is_temp_file:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
 
-        added_count = 0
-        for code in code_list:
-            try:
-                query = f"INSERT IGNORE INTO {self.TABLE_CODES} (code, item_type) VALUES (%s, %s)"
-                rows_affected = await self._execute_query(query, (code, internal_id))
-                if rows_affected > 0:
-                    added_count += 1
-            except Exception as db_err:
-                logger.error(f"导入兑换码 {code} 时数据库出错: {db_err}")
+        total_count, added_count, input_duplicates, invalid_count = stats
+        if total_count == 0:
+            yield event.plain_result("未找到有效的兑换码。")
+            return
 
-        yield event.plain_result(
+        existing_count = total_count - added_count - input_duplicates - invalid_count
+        source_text = "文件" if file_path else "指令"
+        reply_text = (
             f"为【{item_name}】导入操作完成！\n"
-            f"从指令中读取到 {len(code_list)} 个兑换码，成功添加 {added_count} 个。"
+            f"从{source_text}中读取到 {total_count} 个兑换码，成功添加 {added_count} 个。\n"
+            f"重复跳过 {input_duplicates + existing_count} 个 (本次重复 {input_duplicates} 个，库中已存在 {existing_count} 个)。"
         )
+        if invalid_count:
+            reply_text += f"\n超过 {self.MAX_CODE_LENGTH} 个字符的无效兑换码 {invalid_count} 个。"
+        yield event.plain_result(reply_text)
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("调整积分", alias={'奖励积分'})
+    @require_database_ready
     async def adjust_points_manual(self, event: AstrMessageEvent, user_id: int, points_delta: int):
-        original_points = 0
-        new_points = 0
-        
-        async with self.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                try:
-                    await conn.begin()
-                    
-                    await cur.execute(f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s FOR UPDATE", (user_id,))
-                    result = await cur.fetchone()
-                    
-                    if result is None:
-                        original_points = 0
-                        new_points = max(0, original_points + points_delta)
-                        if new_points > 0:
-                           await cur.execute(f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (%s, %s, NULL)", (user_id, new_points))
-                        else:
-                           yield event.plain_result(f"操作失败：用户 {user_id} 不存在，且操作结果为0或负积分。")
-                           await conn.rollback()
-                           return
-                    else:
-                        original_points = result[0]
-                        new_points = max(0, original_points + points_delta)
-                        await cur.execute(f"UPDATE {self.TABLE_USERS} SET points = %s WHERE qq_id = %s", (new_points, user_id))
-                    
-                    await conn.commit()
-                except Exception as e:
-                    await conn.rollback()
-                    logger.error(f"管理员调整用户 {user_id} 积分时发生数据库事务错误: {e}", exc_info=True)
-                    yield event.plain_result(f"调整积分失败，发生意外的数据库错误。")
-                    return
+        try:
+            result = await self.storage.adjust_points(user_id, points_delta)
+        except Exception as e:
+            logger.error(f"管理员调整用户 {user_id} 积分时发生数据库事务错误: {e}", exc_info=True)
+            yield event.plain_result(f"调整积分失败，发生意外的数据库错误。")
+            return
+        if result is None:
+            yield event.plain_result(f"操作失败：用户 {user_id} 不存在，且操作结果为0或负积分。")
+            return
+        original_points, new_points = result
+        self._leaderboard.update(user_id, new_points)
+        self._record_ledger(user_id, new_points - original_points, "admin")
 
         action_text = "奖励" if points_delta >= 0 else "扣除"
         abs_delta = abs(points_delta)
@@ -371,9 +1135,208 @@ class CheckinPluginPro(Star):
             f"其积分已从 {original_points} 变为 {new_points}。"
         )
 
+    # --- 批量积分操作与用户数据迁移 ---
+    async def _bulk_adjust_points(self, user_ids: list[int], points_delta: int) -> list[tuple[int, int, int]]:
+        changes = await self.storage.bulk_adjust_points(user_ids, points_delta)
+        # 批量变动可能涉及大量用户，直接让排行榜缓存失效，下次查看时按索引重新载入
+        self._leaderboard.invalidate()
+        for user_id, original_points, new_points in changes:
+            self._record_ledger(user_id, new_points - original_points, "bulk")
+        return changes
+
+    def _format_bulk_adjust_result(self, requested: int, changes: list, points_delta: int) -> str:
+        action_text = "奖励" if points_delta >= 0 else "扣除"
+        reply_text = f"操作成功！\n已为 {len(changes)} 名用户{action_text} {abs(points_delta)} 积分" + ("。" if points_delta >= 0 else " (积分最低扣至 0)。")
+        skipped = requested - len(changes)
+        if skipped:
+            reply_text += f"\n{skipped} 名用户没有积分记录，已跳过。"
+        return reply_text
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("批量调整积分")
+    @require_database_ready
+    @instrumented_handler("bulk_adjust_points")
+    async def bulk_adjust_points_command(self, event: AstrMessageEvent, points_delta: int):
+        """为多名用户调整积分：QQ 号写在指令的下一行起，以空格、逗号或换行分隔。"""
+        _, _, targets_text = event.message_str.partition('\n')
+        tokens = targets_text.replace(',', ' ').replace('，', ' ').split()
+        # isdigit 也接受 “²” 等非 ASCII 数字；超出 64 位整数范围的 QQ 号无法写入数据库
+        valid_tokens = [
+            token for token in tokens
+            if token.isascii() and token.isdigit() and len(token) <= 19 and 0 < int(token) <= self.LEDGER_MAX_ID
+        ]
+        user_ids = list(dict.fromkeys(int(token) for token in valid_tokens))
+        invalid_count = len(tokens) - len(valid_tokens)
+        if not user_ids or not points_delta:
+            yield event.plain_result("用法：/批量调整积分 [要增加或减少的数值]，并在下一行起列出 QQ 号 (以空格、逗号或换行分隔)。")
+            return
+
+        try:
+            changes = await self._bulk_adjust_points(user_ids, points_delta)
+        except Exception as e:
+            logger.error(f"批量调整 {len(user_ids)} 名用户的积分时发生数据库事务错误: {e}", exc_info=True)
+            yield event.plain_result("批量调整积分失败，发生意外的数据库错误，本次操作已全部回滚。")
+            return
+        reply_text = self._format_bulk_adjust_result(len(user_ids), changes, points_delta)
+        if invalid_count:
+            reply_text += f"\n{invalid_count} 个无效的 QQ 号已忽略。"
+        yield event.plain_result(reply_text)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("全群调整积分")
+    @require_database_ready
+    @instrumented_handler("group_adjust_points")
+    async def group_adjust_points_command(self, event: AstrMessageEvent, points_delta: int):
+        """为当前群的全部成员 (不含机器人自身) 调整积分。"""
+        if not isinstance(event, AiocqhttpMessageEvent):
+            return
+        group_id = self._normalize_group_id(event.get_group_id())
+        if group_id is None:
+            yield event.plain_result("请在群聊中使用此指令。")
+            return
+        if not await self.is_group_whitelisted(group_id):
+            yield event.plain_result("该群不在白名单中。")
+            return
+        if not points_delta:
+            yield event.plain_result("积分变动值不能为 0。")
+            return
+
+        try:
+            members = await event.bot.get_group_member_list(group_id=group_id)
+        except Exception as e:
+            logger.error(f"获取群 {group_id} 的成员列表失败: {e}", exc_info=True)
+            yield event.plain_result("获取群成员列表失败，请稍后重试。")
+            return
+        self_id = str(event.get_self_id())
+        user_ids = [int(member["user_id"]) for member in members if str(member.get("user_id")) != self_id]
+
+        try:
+            changes = await self._bulk_adjust_points(user_ids, points_delta)
+        except Exception as e:
+            logger.error(f"为群 {group_id} 的 {len(user_ids)} 名成员调整积分时发生数据库事务错误: {e}", exc_info=True)
+            yield event.plain_result("全群调整积分失败，发生意外的数据库错误，本次操作已全部回滚。")
+            return
+        yield event.plain_result(self._format_bulk_adjust_result(len(user_ids), changes, points_delta))
+
+    async def _export_users(self, path: str) -> int:
+        """将 users 表流式写入 CSV 文件，返回导出的行数。先写临时文件，完成后再替换。"""
+        temp_path = path + ".part"
+        count = 0
+        try:
+            with open(temp_path, "w", encoding="utf-8", newline="") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(self.USERS_CSV_HEADER)
+                async for rows in self.storage.iter_users(self.USERS_EXPORT_BATCH_SIZE):
+                    await asyncio.to_thread(writer.writerows, rows)
+                    count += len(rows)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return count
+
+    async def _import_users(self, rows, batch_size: int):
+        """
+        在单个事务内分批写入用户数据，已存在的用户会被覆盖。
+        :param rows: CSV 行迭代器，在线程中按需读取
+        :return: (读取数, 写入数, 无效数)
+        """
+        stats = {"total": 0, "invalid": 0}
+
+        def clean_batches():
+            batch = []
+            for index, row in enumerate(rows):
+                if not row or (index == 0 and row[0].strip().lower() == self.USERS_CSV_HEADER[0]):
+                    continue
+                stats["total"] += 1
+                parsed = _parse_user_row(row)
+                if parsed is None:
+                    stats["invalid"] += 1
+                    continue
+                batch.append(parsed)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        changes = await self.storage.import_users(clean_batches(), threaded=True)
+        # 导入覆盖了积分与签到日期：排行榜缓存与当日已签到集合都可能已过期
+        self._leaderboard.invalidate()
+        self._checked_in_today = set()
+        for user_id, original_points, new_points in changes:
+            self._record_ledger(user_id, new_points - original_points, "import")
+        return stats["total"], len(changes), stats["invalid"]
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("导出用户数据")
+    @require_database_ready
+    @instrumented_handler("export_users")
+    async def export_users_command(self, event: AstrMessageEvent):
+        data_dir = StarTools.get_data_dir(self.PLUGIN_NAME)
+        file_name = f"users_{datetime.now(self.settings.tz):%Y%m%d_%H%M%S}.csv"
+        path = os.path.join(data_dir, file_name)
+        try:
+            count = await self._export_users(path)
+        except Exception as e:
+            logger.error(f"导出用户数据失败: {e}", exc_info=True)
+            yield event.plain_result("导出失败，发生意外错误。")
+            return
+        self._prune_user_exports(data_dir)
+        logger.info(f"已导出 {count} 名用户的积分数据到 {path}。")
+
+        # 导出文件包含全部用户的积分，只在私聊中发送，避免群成员看到
+        if event.get_group_id():
+            yield event.plain_result(f"已导出 {count} 名用户的积分数据，文件 {file_name} 已保存在插件数据目录。私聊发送此指令可直接接收文件。")
+            return
+        yield event.plain_result(f"已导出 {count} 名用户的积分数据。")
+        yield event.chain_result([File(name=file_name, file=path)])
+
+    def _prune_user_exports(self, data_dir):
+        """只保留最近 USERS_EXPORT_KEEP 份导出文件 (文件名含时间，按名称排序即按时间排序)。"""
+        exports = sorted(name for name in os.listdir(data_dir) if name.startswith("users_") and name.endswith(".csv"))
+        for name in exports[:-self.USERS_EXPORT_KEEP]:
+            try:
+                os.remove(os.path.join(data_dir, name))
+            except OSError as e:
+                logger.warning(f"删除旧的用户数据导出文件 {name} 失败: {e}")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("导入用户数据")
+    @require_database_ready
+    @instrumented_handler("import_users")
+    async def import_users_command(self, event: AstrMessageEvent):
+        file_path, is_temp_file = await self._find_attached_file(event)
+        if not file_path:
+            yield event.plain_result("请随指令附带 (引用) 一个由 /导出用户数据 生成的 csv 文件。")
+            return
+
+        try:
+            with open(file_path, encoding='utf-8-sig', errors='replace', newline='') as fh:
+                total_count, written_count, invalid_count = await self._import_users(csv.reader(fh), self.settings.import_batch_size)
+        except Exception as e:
+            logger.error(f"导入用户数据时出错: {e}", exc_info=True)
+            yield event.plain_result("导入失败，发生意外错误，本次导入已全部回滚，请检查后重试。")
+            return
+        finally:
+            if is_temp_file:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+        reply_text = f"用户数据导入完成！\n读取到 {total_count} 行，写入 {written_count} 名用户 (已存在的用户积分与签到日期被覆盖)。"
+        if invalid_count:
+            reply_text += f"\n格式无效的行 {invalid_count} 行，已跳过。"
+        yield event.plain_result(reply_text)
+
     @filter.event_message_type(filter.EventMessageType.ALL)
     async def handle_group_member_decrease(self, event: AstrMessageEvent):
-        if not isinstance(event, AiocqhttpMessageEvent):
+        # 本处理器会收到机器人的每一条事件：普通消息的 message_str 非空，直接返回
+        if event.message_str or not isinstance(event, AiocqhttpMessageEvent):
             return
 
         raw_message = getattr(event.message_obj, "raw_message", None)
@@ -385,39 +1348,120 @@ class CheckinPluginPro(Star):
         ):
             return
 
-        group_id = raw_message.get("group_id")
-        user_id = raw_message.get("user_id")
-        
-        if not await self.is_group_whitelisted(group_id):
+        group_id = self._normalize_group_id(raw_message.get("group_id"))
+        try:
+            user_id = int(raw_message.get("user_id"))
+        except (TypeError, ValueError):
+            return
+        if group_id is None:
             return
 
-        try:
-            rows_deleted = await self._execute_query(f"DELETE FROM {self.TABLE_USERS} WHERE qq_id = %s", (user_id,))
-            
-            if rows_deleted > 0:
-                logger.info(f"用户 {user_id} 的数据已从数据库中清除 (群: {group_id})。")
-                
-                client = event.bot
-                operator_id = raw_message.get("operator_id")
-                sub_type = raw_message.get("sub_type")
-
-                user_info = await client.get_stranger_info(user_id=user_id, no_cache=True)
-                user_nickname = user_info.get("nickname", str(user_id))
-
-                announcement = ""
-                if sub_type == "leave":
-                    announcement = f"用户 {user_nickname} ({user_id}) 已主动退出本群。\n其在本插件中的所有积分数据已被同步清除。"
-                elif sub_type == "kick":
-                    operator_info = await client.get_group_member_info(group_id=group_id, user_id=operator_id)
-                    operator_nickname = operator_info.get("card") or operator_info.get("nickname", str(operator_id))
-                    announcement = f"用户 {user_nickname} ({user_id}) 已被管理员 {operator_nickname} 移出本群。\n其在本插件中的所有积分数据已被同步清除。"
-                
-                if announcement:
-                    yield event.plain_result(announcement)
-            else:
-                logger.info(f"用户 {user_id} 退出了群 {group_id}，但其在数据库中无数据，无需清理。")
+        if not await self.wait_until_ready() or not await self.is_group_whitelisted(group_id):
+            return
+
+        self._bot_client = event.bot
+        operator_id = raw_message.get("operator_id")
+        departure = MemberDeparture(user_id, int(operator_id) if operator_id else None, raw_message.get("sub_type"))
+        pending = self._pending_departures.setdefault(group_id, [])
+        pending.append(departure)
+        if len(pending) == 1:
+            task = asyncio.create_task(self._flush_departures_later(group_id))
+            self._departure_tasks.add(task)
+            task.add_done_callback(self._departure_tasks.discard)
 
-        except Exception as e:
-            logger.error(f"处理用户 {user_id} 退群事件时发生数据库错误: {e}", exc_info=True)
-            
         event.stop_event()
+
+    async def _flush_departures_later(self, group_id: int):
+        """等待合并窗口结束后处理该群积累的退群事件。"""
+        await asyncio.sleep(self.settings.member_leave_batch_seconds)
+        await self._flush_departures(group_id)
+
+    async def _flush_departures(self, group_id: int, announce: bool = True):
+        # 持有流水写入锁：正在写入的流水批次完成后才删除用户，避免其中的流水在删除之后落库
+        async with self._ledger_flush_lock:
+            departures = self._pending_departures.pop(group_id, [])
+            # 同一用户在窗口内只处理一次，以最后一条事件为准
+            by_user = {departure.user_id: departure for departure in departures}
+            if not by_user:
+                return
+
+            # 尚未写入的流水随用户数据一并丢弃
+            self._ledger_pending = [entry for entry in self._ledger_pending if entry[0] not in by_user]
+            try:
+                deleted = await self.storage.delete_users(list(by_user))
+            except Exception as e:
+                logger.error(f"处理群 {group_id} 的 {len(by_user)} 个退群事件时发生数据库错误: {e}", exc_info=True)
+                return
+
+        # 用户数据已删除，重新入群后应允许当天再次签到
+        for user_id in by_user:
+            self._checked_in_today.discard(str(user_id))
+            self._leaderboard.remove(user_id)
+
+        skipped = len(by_user) - len(deleted)
+        logger.info(f"群 {group_id} 有 {len(by_user)} 名用户退群，已清除 {len(deleted)} 名用户的数据" + (f"，{skipped} 名无数据无需清理。" if skipped else "。"))
+
+        departed = [by_user[user_id] for user_id in deleted if by_user[user_id].sub_type in ("leave", "kick")]
+        if not announce or not departed:
+            return
+
+        client = self._get_bot_client()
+        if client is None:
+            logger.warning(f"未找到可用的 aiocqhttp 客户端，无法在群 {group_id} 发送退群公告。")
+            return
+        try:
+            announcement = await self._render_departure_announcement(client, group_id, departed)
+            await client.send_group_msg(group_id=group_id, message=announcement)
+        except Exception as e:
+            logger.error(f"在群 {group_id} 发送退群公告失败: {e}", exc_info=True)
+
+    async def _render_departure_announcement(self, client, group_id: int, departed: list[MemberDeparture]) -> str:
+        if len(departed) == 1:
+            departure = departed[0]
+            user_nickname = await self._lookup_nickname(client, departure.user_id)
+            if departure.sub_type == "leave":
+                return f"用户 {user_nickname} ({departure.user_id}) 已主动退出本群。\n其在本插件中的所有积分数据已被同步清除。"
+            operator_nickname = await self._lookup_member_name(client, group_id, departure.operator_id)
+            return f"用户 {user_nickname} ({departure.user_id}) 已被管理员 {operator_nickname} 移出本群。\n其在本插件中的所有积分数据已被同步清除。"
+
+        listed = departed[:self.DEPARTURE_ANNOUNCE_MAX_NAMES]
+        nicknames = await asyncio.gather(*(self._lookup_nickname(client, departure.user_id) for departure in listed))
+        lines = [f"{nickname} ({departure.user_id})" for nickname, departure in zip(nicknames, listed)]
+        if len(departed) > len(listed):
+            lines.append(f"…等共 {len(departed)} 人")
+        kicked = sum(1 for departure in departed if departure.sub_type == "kick")
+        return (
+            f"{len(departed)} 名用户已离开本群 (主动退出 {len(departed) - kicked} 人，被移出 {kicked} 人)：\n"
+            + "\n".join(lines)
+            + "\n他们在本插件中的所有积分数据已被同步清除。"
+        )
+
+    async def _lookup_nickname(self, client, user_id: int) -> str:
+        """查询用户昵称 (带缓存)，失败时返回 QQ 号。"""
+        key = ("stranger", user_id)
+        nickname = self._nickname_cache.get(key)
+        if nickname is None:
+            try:
+                user_info = await client.get_stranger_info(user_id=user_id)
+                nickname = user_info.get("nickname") or str(user_id)
+            except Exception as e:
+                logger.warning(f"查询用户 {user_id} 的昵称失败: {e}")
+                return str(user_id)
+            self._nickname_cache.set(key, nickname)
+        return nickname
+
+    async def _lookup_member_name(self, client, group_id: int, user_id: int | None) -> str:
+        """查询群成员的群名片或昵称 (带缓存)，失败时返回 QQ 号。"""
+        if user_id is None:
+            return "未知"
+        key = ("member", group_id, user_id)
+        name = self._nickname_cache.get(key)
+        if name is None:
+            try:
+                member_info = await client.get_group_member_info(group_id=group_id, user_id=user_id)
+                name = member_info.get("card") or member_info.get("nickname") or str(user_id)
+            except Exception as e:
+                logger.warning(f"查询群 {group_id} 成员 {user_id} 的名片失败: {e}")
+                return str(user_id)
+            self._nickname_cache.set(key, name)
+        return name
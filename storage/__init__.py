@@ -0,0 +1,22 @@
+from .base import (
+    CHECKIN_DUPLICATE, CHECKIN_NEW, CHECKIN_UPDATED, OUTBOX_FAILED, OUTBOX_PENDING, OUTBOX_SENT,
+    REDEEM_INSUFFICIENT_POINTS, REDEEM_OK, REDEEM_OUT_OF_STOCK, RedeemResult, StorageBackend,
+)
+
+BACKENDS = ("mysql", "sqlite")
+
+
+def create_storage(db_conf: dict, metrics, default_sqlite_path) -> StorageBackend:
+    """
+    按 database.backend 配置创建存储后端。
+    :param default_sqlite_path: 未配置 sqlite_path 时调用，返回默认的数据库文件路径
+    """
+    backend = str(db_conf.get('backend') or 'mysql').strip().lower()
+    # 按需导入，使用 SQLite 时无需安装 aiomysql
+    if backend == 'sqlite':
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage(db_conf.get('sqlite_path') or default_sqlite_path(), metrics)
+    if backend == 'mysql':
+        from .mysql import MySQLStorage
+        return MySQLStorage(db_conf, metrics)
+    raise ValueError(f"未知的存储后端: {backend} (可选: {', '.join(BACKENDS)})")
@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date
+from typing import AsyncIterator
+
+# 签到结果 (与 MySQL upsert 的影响行数含义一致)
+CHECKIN_DUPLICATE, CHECKIN_NEW, CHECKIN_UPDATED = 0, 1, 2
+# 兑换结果
+REDEEM_OK, REDEEM_INSUFFICIENT_POINTS, REDEEM_OUT_OF_STOCK = 0, 1, 2
+# 兑换码发送箱状态
+OUTBOX_PENDING, OUTBOX_SENT, OUTBOX_FAILED = 0, 1, 2
+
+
+@dataclass(frozen=True, slots=True)
+class RedeemResult:
+    """兑换事务的结果；points 为兑换前的积分，用户不存在时为 None。"""
+    status: int
+    points: int | None
+    code: str | None = None
+    outbox_id: int | None = None
+
+
+class StorageBackend(ABC):
+    """
+    插件的存储接口：用户积分、兑换码与库存、白名单、兑换码发送箱、积分流水。
+    插件只通过此接口读写数据，具体实现见 MySQLStorage 与 SQLiteStorage。
+    所有方法在事件循环中调用；查询耗时按标签记录到传入的 Metrics 的 "query" 分组。
+    """
+    TABLE_USERS = "users"
+    TABLE_CODES = "codes"
+    TABLE_WHITELIST = "whitelisted_groups"
+    TABLE_STOCK = "item_stock"
+    TABLE_OUTBOX = "code_outbox"
+    TABLE_LEDGER = "points_ledger"
+    TABLE_LEDGER_SUMMARY = "points_ledger_summary"
+
+    name = ""
+    # 批量操作中单条语句携带的最大行数
+    CHUNK_SIZE = 500
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    # --- 生命周期 ---
+    @abstractmethod
+    async def open(self):
+        """建立连接并创建 (或升级) 表结构；失败时抛出异常，由调用方重试。"""
+
+    @abstractmethod
+    async def close(self):
+        """关闭连接，可重复调用。"""
+
+    def status_text(self) -> str:
+        """用于性能统计报告的当前状态描述 (连接池、写队列等)。"""
+        return ""
+
+    # --- 用户积分 ---
+    @abstractmethod
+    async def checkin(self, qq_id: int, first_points: int, today: date, bonus: int) -> tuple[int, int | None]:
+        """
+        新用户以 first_points 建档；老用户仅在 last_checkin 早于 today 时加 bonus 积分。
+        :return: (CHECKIN_* 结果, 更新后的积分)；积分未知或未变化时为 None
+        """
+
+    @abstractmethod
+    async def get_points(self, qq_id: int, label: str = "query_points") -> int | None:
+        """返回用户积分，用户不存在时返回 None。"""
+
+    @abstractmethod
+    async def top_users(self, limit: int, offset: int = 0, label: str = "leaderboard_page") -> list[tuple[int, int]]:
+        """按 points 降序、qq_id 降序返回 (qq_id, points) 列表。"""
+
+    @abstractmethod
+    async def count_users_ahead(self, qq_id: int, points: int) -> int:
+        """排在给定用户之前的人数 (排序规则同 top_users)。"""
+
+    @abstractmethod
+    async def adjust_points(self, qq_id: int, delta: int) -> tuple[int, int] | None:
+        """
+        在事务内调整积分 (结果不低于 0)，用户不存在时建档。
+        :return: (原积分, 新积分)；用户不存在且结果不大于 0 时不做修改并返回 None
+        """
+
+    @abstractmethod
+    async def bulk_adjust_points(self, qq_ids: list[int], delta: int) -> list[tuple[int, int, int]]:
+        """
+        在一个事务内为一批用户调整积分 (结果不低于 0)，每 CHUNK_SIZE 个用户共用一条多行语句。
+        delta 为正时为不存在的用户建档，为负时跳过不存在的用户。
+        :return: 实际处理的 (QQ 号, 原积分, 新积分) 列表
+        """
+
+    @abstractmethod
+    async def delete_users(self, qq_ids: list[int]) -> list[int]:
+        """在一个事务内删除一批用户的数据 (含积分流水)，返回确有积分数据被删除的 QQ 号。"""
+
+    # --- 用户数据导出 / 导入 ---
+    @abstractmethod
+    def iter_users(self, batch_size: int) -> AsyncIterator[list[tuple]]:
+        """
+        按 qq_id 升序流式读取全部用户 (qq_id, points, last_checkin)，last_checkin 为 ISO 日期文本或 None。
+        每次产出至多 batch_size 行，不会把整张表载入内存；迭代期间占用一个数据库连接。
+        """
+
+    @abstractmethod
+    async def import_users(self, batches, threaded: bool = False) -> list[tuple[int, int, int]]:
+        """
+        在单个事务内写入用户，已存在的用户以导入的积分与签到日期覆盖。
+        :param batches: 产出 (qq_id, points, last_checkin) 列表的同步迭代器，按需读取
+        :param threaded: 同 import_codes
+        :return: 写入的 (QQ 号, 原积分, 新积分) 列表，新用户的原积分为 0；同一批次内重复的 QQ 号以最后一行为准
+        """
+
+    # --- 兑换码与库存 ---
+    @abstractmethod
+    async def redeem(self, qq_id: int, item_type: str, item_name: str, cost: int) -> RedeemResult:
+        """在同一事务内校验并扣除积分、取出一个兑换码并写入发送箱。"""
+
+    @abstractmethod
+    async def import_codes(self, item_type: str, batches, threaded: bool = False) -> int:
+        """
+        在单个事务内写入兑换码并累加库存计数，已存在的兑换码会被跳过。
+        :param batches: 产出兑换码列表的同步迭代器，按需读取
+        :param threaded: 为 True 时在线程中推进迭代器 (迭代器会读取文件)
+        :return: 实际新增的数量
+        """
+
+    @abstractmethod
+    async def load_stock(self) -> dict[str, int]:
+        """读取库存计数表。"""
+
+    @abstractmethod
+    async def reconcile_stock(self) -> dict[str, int]:
+        """按兑换码表的实际数量重写库存计数表，返回各商品的数量。"""
+
+    @abstractmethod
+    async def add_stock(self, item_type: str, delta: int):
+        """将库存增量写回计数表 (结果不低于 0)。"""
+
+    # --- 白名单 ---
+    @abstractmethod
+    async def load_whitelist(self) -> set[int]:
+        pass
+
+    @abstractmethod
+    async def add_whitelist(self, group_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def remove_whitelist(self, group_id: int) -> bool:
+        pass
+
+    # --- 兑换码发送箱 ---
+    @abstractmethod
+    async def load_due_outbox(self, now: int, limit: int) -> list[tuple]:
+        """返回到期待发送的记录 (id, qq_id, item_name, cost, code, attempts)，按 id 升序。"""
+
+    @abstractmethod
+    async def claim_outbox(self, outbox_id: int, now: int, lease_until: int) -> bool:
+        """领取一条到期的待发送记录，租约持续到 lease_until；已被他人领取时返回 False。"""
+
+    @abstractmethod
+    async def delete_outbox(self, outbox_id: int):
+        """发送成功后删除记录，发送箱不保留已发出的兑换码。"""
+
+    @abstractmethod
+    async def mark_outbox_failed(self, outbox_id: int, attempts: int, next_attempt_at: int, error: str, final: bool):
+        """记录一次发送失败；final 为 True 时不再自动重试。"""
+
+    @abstractmethod
+    async def requeue_failed_outbox(self, qq_id: int | None = None) -> int:
+        """将发送失败的记录重新置为待发送，返回记录数。"""
+
+    # --- 积分流水 ---
+    @abstractmethod
+    async def append_ledger(self, entries: list[tuple]):
+        """在一个事务内批量写入积分流水，entries 为 (qq_id, delta, reason, item, created_at) 列表。"""
+
+    @abstractmethod
+    async def ledger_page(self, qq_id: int, before_id: int | None, limit: int) -> list[tuple]:
+        """
+        按 id 降序返回用户的流水 (id, delta, reason, item, created_at)。
+        键集分页：before_id 为上一页最后一条的 id，走 (qq_id, id) 索引，翻页代价与页码无关。
+        """
+
+    @abstractmethod
+    async def ledger_summary(self, qq_id: int) -> tuple[int, int, int] | None:
+        """返回用户已合并流水的 (积分变动合计, 条数, 最后一条的时间)，没有时返回 None。"""
+
+    @abstractmethod
+    async def compact_ledger(self, before: int, limit: int) -> int:
+        """
+        将 id 最小的至多 limit 条流水中早于 before (时间戳) 的部分累加进各用户的汇总并删除。
+
+        流水按时间顺序批量写入，id 顺序与 created_at 顺序基本一致，因此只沿主键扫描表头的 limit 行，
+        取其中早于 before 的最大 id 作为上界 upper_id，再按 id 范围 (id <= upper_id) 合并。
+        按范围合并意味着 id 不超过 upper_id 但 created_at 晚于 before 的少数流水也会一并并入汇总。
+        :return: 合并的条数；小于 limit 时说明已没有更多可合并的旧流水
+        """
@@ -0,0 +1,626 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+from astrbot.api import logger
+
+from .base import (
+    CHECKIN_NEW, CHECKIN_UPDATED, OUTBOX_FAILED, OUTBOX_PENDING, OUTBOX_SENT,
+    REDEEM_INSUFFICIENT_POINTS, REDEEM_OK, REDEEM_OUT_OF_STOCK, RedeemResult, StorageBackend,
+)
+
+
+class MySQLStorage(StorageBackend):
+    """基于 aiomysql 连接池的 MySQL 存储。"""
+    name = "mysql"
+    # MySQL 锁等待超时与死锁的错误码
+    LOCK_ERROR_CODES = {1205: "lock_wait_timeout", 1213: "deadlock"}
+    # 连接已断开类错误码 (无法连接、server has gone away、查询中断线等)，可换连接重试
+    CONNECTION_ERROR_CODES = {2003, 2006, 2013, 2055}
+
+    def __init__(self, db_conf: dict, metrics):
+        super().__init__(metrics)
+        self.db_conf = db_conf
+        self.pool = None
+        # 数据库是否支持 FOR UPDATE SKIP LOCKED (MySQL 8.0.1+ / MariaDB 10.6+)，启动时探测
+        self.supports_skip_locked = False
+
+    async def open(self):
+        db_conf = self.db_conf
+        minsize = max(1, int(db_conf.get('pool_minsize', 1)))
+        maxsize = max(minsize, int(db_conf.get('pool_maxsize', 10)))
+        # create_pool 会预先建立 minsize 个连接
+        self.pool = await aiomysql.create_pool(
+            host=db_conf.get('host'), port=db_conf.get('port'), user=db_conf.get('user'),
+            password=db_conf.get('password'), db=db_conf.get('db_name'), autocommit=True,
+            minsize=minsize, maxsize=maxsize,
+            connect_timeout=db_conf.get('connect_timeout', 10), pool_recycle=db_conf.get('pool_recycle', 3600)
+        )
+        logger.info(f"数据库连接池(配置驱动)创建成功 (连接数 {minsize}~{maxsize})。")
+
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_USERS} (
+                qq_id BIGINT PRIMARY KEY, points INT DEFAULT 0, last_checkin DATE,
+                INDEX idx_users_points (points)
+            );
+            """)
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_CODES} (
+                id INT AUTO_INCREMENT PRIMARY KEY, code VARCHAR(255) NOT NULL,
+                item_type VARCHAR(255) NOT NULL,
+                UNIQUE (code),
+                INDEX idx_codes_item_type (item_type, id)
+            );
+            """)
+        await self._execute_query(f"CREATE TABLE IF NOT EXISTS {self.TABLE_WHITELIST} (group_id BIGINT PRIMARY KEY);")
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_STOCK} (
+                item_type VARCHAR(255) PRIMARY KEY, stock INT NOT NULL DEFAULT 0
+            );
+            """)
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_OUTBOX} (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY, qq_id BIGINT NOT NULL,
+                item_name VARCHAR(255) NOT NULL, cost INT NOT NULL, code VARCHAR(255) NOT NULL,
+                status TINYINT NOT NULL DEFAULT 0, attempts INT NOT NULL DEFAULT 0,
+                next_attempt_at BIGINT NOT NULL DEFAULT 0, last_error VARCHAR(255),
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_outbox_status_next (status, next_attempt_at),
+                INDEX idx_outbox_qq_id (qq_id)
+            );
+            """)
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_LEDGER} (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY, qq_id BIGINT NOT NULL, delta INT NOT NULL,
+                reason VARCHAR(32) NOT NULL, item VARCHAR(255), created_at BIGINT NOT NULL,
+                INDEX idx_ledger_qq_id (qq_id, id)
+            );
+            """)
+        await self._execute_query(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_LEDGER_SUMMARY} (
+                qq_id BIGINT PRIMARY KEY, delta_total BIGINT NOT NULL DEFAULT 0,
+                entries INT NOT NULL DEFAULT 0, last_at BIGINT NOT NULL DEFAULT 0
+            );
+            """)
+
+        # 旧版本创建的表缺少索引，在此补齐
+        await self._ensure_index(self.TABLE_CODES, "idx_codes_item_type", "item_type, id")
+        await self._ensure_index(self.TABLE_USERS, "idx_users_points", "points")
+        # 旧版本会保留已发送的记录 (含兑换码明文)，在此清除
+        purged = await self._execute_query(
+            f"DELETE FROM {self.TABLE_OUTBOX} WHERE status = %s", (OUTBOX_SENT,), label="outbox_purge_sent"
+        )
+        if purged:
+            logger.info(f"已清除发送箱中 {purged} 条已发送的记录。")
+
+        logger.info("数据库表初始化检查完成。")
+
+        await self._detect_skip_locked()
+        await self._warm_up_pool(minsize)
+
+    async def close(self):
+        if self.pool:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def status_text(self) -> str:
+        if not self.pool:
+            return ""
+        return f"[连接池] 当前 {self.pool.size} / 上限 {self.pool.maxsize}，空闲 {self.pool.freesize}"
+
+    async def _warm_up_pool(self, minsize: int):
+        """并发占用 minsize 个连接各执行一次健康检查，确认预建连接均可用。"""
+        results = await asyncio.gather(
+            *(self._execute_query("SELECT 1", fetch='one', label="health_check") for _ in range(minsize))
+        )
+        if not all(row and row[0] == 1 for row in results):
+            raise RuntimeError(f"数据库健康检查未通过: {results}")
+        logger.info(f"数据库健康检查通过，已预热 {minsize} 个连接。")
+
+    async def _ensure_index(self, table: str, index_name: str, columns: str):
+        """若索引不存在则创建，用于升级旧版本建立的表。"""
+        query = (
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1"
+        )
+        if await self._execute_query(query, (table, index_name), fetch='one'):
+            return
+        await self._execute_query(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})")
+        logger.info(f"已为表 {table} 添加索引 {index_name} ({columns})。")
+
+    async def _detect_skip_locked(self):
+        try:
+            await self._execute_query(f"SELECT id FROM {self.TABLE_CODES} WHERE 1 = 0 FOR UPDATE SKIP LOCKED")
+            self.supports_skip_locked = True
+        except (aiomysql.ProgrammingError, aiomysql.NotSupportedError):
+            self.supports_skip_locked = False
+            logger.warning("当前数据库不支持 SKIP LOCKED，同一商品的并发兑换将依次排队执行。")
+
+    # --- 数据库辅助核心 ---
+    @asynccontextmanager
+    async def _acquire(self):
+        """从连接池获取连接，并记录等待时间与连接池占用情况。"""
+        pool = self.pool
+        if pool.freesize == 0 and pool.size >= pool.maxsize:
+            self.metrics.incr("pool_saturated")
+        start = time.perf_counter()
+        async with pool.acquire() as conn:
+            self.metrics.observe("pool", "acquire_wait", time.perf_counter() - start)
+            self.metrics.peak("pool_in_use", pool.size - pool.freesize)
+            yield conn
+
+    async def _cursor_execute(self, cur, label: str, query: str, args=None):
+        """在给定游标上执行语句并按标签记录耗时；锁等待超时与死锁单独计数。"""
+        start = time.perf_counter()
+        try:
+            await cur.execute(query, args)
+        except aiomysql.Error as e:
+            lock_error = self.LOCK_ERROR_CODES.get(e.args[0] if e.args else None)
+            if lock_error:
+                self.metrics.incr(lock_error)
+            raise
+        finally:
+            self.metrics.observe("query", label, time.perf_counter() - start)
+
+    async def _rollback(self, conn, label: str):
+        self.metrics.incr(f"rollback.{label}")
+        try:
+            await conn.rollback()
+        except Exception as e:
+            # 连接已损坏：直接关闭，归还时连接池会将其丢弃
+            logger.warning(f"事务回滚失败，已关闭该连接: {e}")
+            conn.close()
+
+    def _is_connection_error(self, error: Exception) -> bool:
+        if isinstance(error, aiomysql.InterfaceError):
+            return True
+        return isinstance(error, aiomysql.OperationalError) and bool(error.args) and error.args[0] in self.CONNECTION_ERROR_CODES
+
+    async def _execute_query(self, query: str, args: tuple = None, fetch: str = None, label: str = None, retry: bool = True):
+        """
+        统一的数据库执行器。
+        :param query: SQL 查询语句
+        :param args: 查询参数
+        :param fetch: 'one' (fetchone), 'all' (fetchall), 'lastrowid' (返回 (rowcount, lastrowid)), None (不 fetch, 返回 rowcount)
+        :param label: 性能统计中使用的查询标签，默认取语句的首个关键字
+        :param retry: 遇到连接断开类错误时是否换一个连接重试一次；非幂等语句应传 False
+        """
+        if not self.pool:
+            raise RuntimeError("数据库连接池未初始化，无法执行查询。")
+        label = label or query.split(None, 1)[0].lower()
+        for attempt in range(2):
+            try:
+                async with self._acquire() as conn:
+                    async with conn.cursor() as cur:
+                        await self._cursor_execute(cur, label, query, args)
+                        if fetch == 'one':
+                            return await cur.fetchone()
+                        elif fetch == 'all':
+                            return await cur.fetchall()
+                        elif fetch == 'lastrowid':
+                            return cur.rowcount, cur.lastrowid
+                        return cur.rowcount
+            except (aiomysql.OperationalError, aiomysql.InterfaceError) as e:
+                # 出错的连接已被关闭，连接池不会再把它分配出去
+                if attempt or not retry or not self._is_connection_error(e):
+                    raise
+                self.metrics.incr("connection_retry")
+                logger.warning(f"数据库连接已断开，正在重试查询 {label}: {e}")
+
+    async def _run_transaction(self, label: str, body, replayable: bool = True):
+        """
+        在一个事务中执行 await body(cur) 并提交，返回 body 的结果；出错时回滚并抛出。
+        提交之前遇到连接断开类错误时换一个连接重试一次：BEGIN 是取出连接后的第一次往返，池中失效的连接会在此报错；
+        之后断开的连接上未提交的事务会被服务器回滚，body 可以整体重放。
+        :param label: 回滚统计与日志中使用的事务标签
+        :param replayable: body 会消费一次性的输入 (如导入批次) 时传 False，只在 BEGIN 失败时重试
+        """
+        for attempt in range(2):
+            began = committing = False
+            try:
+                async with self._acquire() as conn:
+                    async with conn.cursor() as cur:
+                        try:
+                            await conn.begin()
+                            began = True
+                            result = await body(cur)
+                            committing = True
+                            await conn.commit()
+                        except Exception:
+                            await self._rollback(conn, label)
+                            raise
+                return result
+            except (aiomysql.OperationalError, aiomysql.InterfaceError) as e:
+                # 提交时断开无法确认是否已生效，不能重试
+                retryable = not committing and (replayable or not began)
+                if attempt or not retryable or not self._is_connection_error(e):
+                    raise
+                self.metrics.incr("connection_retry")
+                logger.warning(f"数据库连接已断开，正在重试事务 {label}: {e}")
+
+    # --- 用户积分 ---
+    async def checkin(self, qq_id, first_points, today, bonus):
+        # 新用户直接插入；老用户仅在 last_checkin 早于今天时加分并更新日期。
+        # 由于 points 先于 last_checkin 赋值，两处条件判断的都是旧的 last_checkin。
+        # 影响行数 (未启用 CLIENT_FOUND_ROWS 时)：1 = 新插入，2 = 已更新，0 = 今日已签到。
+        # 更新时用 LAST_INSERT_ID(expr) 把新积分带回到 lastrowid，供排行榜缓存使用，无需再查一次。
+        upsert_query = f"""
+            INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                points = IF(last_checkin IS NULL OR last_checkin < VALUES(last_checkin), LAST_INSERT_ID(points + %s), points),
+                last_checkin = IF(last_checkin IS NULL OR last_checkin < VALUES(last_checkin), VALUES(last_checkin), last_checkin)
+            """
+        args = (qq_id, first_points, today, bonus)
+        try:
+            rows_affected, new_points = await self._execute_query(upsert_query, args, fetch='lastrowid', label="checkin_upsert", retry=False)
+        except (aiomysql.OperationalError, aiomysql.InterfaceError) as e:
+            if not self._is_connection_error(e):
+                raise
+            self.metrics.incr("connection_retry")
+            logger.warning(f"数据库连接已断开，正在重试查询 checkin_upsert: {e}")
+            rows_affected, new_points = await self._execute_query(upsert_query, args, fetch='lastrowid', label="checkin_upsert", retry=False)
+            if rows_affected == 0:
+                # 首次执行可能已生效、只是回复丢失：用户会看到“今日已签到”，这次签到也不会记入积分明细与排行榜缓存
+                self.metrics.incr("checkin_retry_duplicate")
+                logger.warning(f"用户 {qq_id} 的签到在连接断开后重试，结果为今日已签到；断开前的签到可能已生效，请核对其积分。")
+        if rows_affected == CHECKIN_NEW:
+            return rows_affected, first_points
+        if rows_affected == CHECKIN_UPDATED:
+            return rows_affected, new_points or None
+        return rows_affected, None
+
+    async def get_points(self, qq_id, label="query_points"):
+        row = await self._execute_query(
+            f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s", (qq_id,), fetch='one', label=label
+        )
+        return row[0] if row else None
+
+    async def top_users(self, limit, offset=0, label="leaderboard_page"):
+        if offset:
+            rows = await self._execute_query(
+                f"SELECT qq_id, points FROM {self.TABLE_USERS} ORDER BY points DESC, qq_id DESC LIMIT %s OFFSET %s",
+                (limit, offset), fetch='all', label=label
+            )
+        else:
+            rows = await self._execute_query(
+                f"SELECT qq_id, points FROM {self.TABLE_USERS} ORDER BY points DESC, qq_id DESC LIMIT %s",
+                (limit,), fetch='all', label=label
+            )
+        return [(int(qq_id), points) for qq_id, points in rows]
+
+    async def count_users_ahead(self, qq_id, points):
+        # 写成 points >= %s 的形式，保证走 idx_users_points 的范围扫描
+        row = await self._execute_query(
+            f"SELECT COUNT(*) FROM {self.TABLE_USERS} WHERE points >= %s AND (points > %s OR qq_id > %s)",
+            (points, points, qq_id), fetch='one', label="rank_count"
+        )
+        return row[0]
+
+    async def adjust_points(self, qq_id, delta):
+        async def body(cur):
+            await self._cursor_execute(cur, "adjust_lock_user", f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s FOR UPDATE", (qq_id,))
+            result = await cur.fetchone()
+
+            if result is None:
+                original_points = 0
+                new_points = max(0, delta)
+                if new_points <= 0:
+                    return None
+                await self._cursor_execute(cur, "adjust_insert_user", f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (%s, %s, NULL)", (qq_id, new_points))
+            else:
+                original_points = result[0]
+                new_points = max(0, original_points + delta)
+                await self._cursor_execute(cur, "adjust_update_points", f"UPDATE {self.TABLE_USERS} SET points = %s WHERE qq_id = %s", (new_points, qq_id))
+            return original_points, new_points
+
+        return await self._run_transaction("adjust_points", body)
+
+    async def bulk_adjust_points(self, qq_ids, delta):
+        qq_ids = list(dict.fromkeys(int(qq_id) for qq_id in qq_ids))
+
+        async def body(cur):
+            changes = []
+            for start in range(0, len(qq_ids), self.CHUNK_SIZE):
+                chunk = qq_ids[start:start + self.CHUNK_SIZE]
+                await self._cursor_execute(
+                    cur, "bulk_adjust_lock",
+                    f"SELECT qq_id, points FROM {self.TABLE_USERS} WHERE qq_id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE", chunk
+                )
+                existing = {int(qq_id): points for qq_id, points in await cur.fetchall()}
+                if existing:
+                    await self._cursor_execute(
+                        cur, "bulk_adjust_update",
+                        f"UPDATE {self.TABLE_USERS} SET points = GREATEST(points + %s, 0) "
+                        f"WHERE qq_id IN ({', '.join(['%s'] * len(existing))})",
+                        [delta, *existing]
+                    )
+                    changes.extend((qq_id, points, max(0, points + delta)) for qq_id, points in existing.items())
+                missing = [qq_id for qq_id in chunk if qq_id not in existing]
+                if delta > 0 and missing:
+                    await self._cursor_execute(
+                        cur, "bulk_adjust_insert",
+                        f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES "
+                        + ", ".join(["(%s, %s, NULL)"] * len(missing)),
+                        [value for qq_id in missing for value in (qq_id, delta)]
+                    )
+                    changes.extend((qq_id, 0, delta) for qq_id in missing)
+            return changes
+
+        return await self._run_transaction("bulk_adjust", body)
+
+    async def delete_users(self, qq_ids):
+        async def body(cur):
+            deleted = []
+            for start in range(0, len(qq_ids), self.CHUNK_SIZE):
+                chunk = qq_ids[start:start + self.CHUNK_SIZE]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                await self._cursor_execute(
+                    cur, "member_delete_lock",
+                    f"SELECT qq_id FROM {self.TABLE_USERS} WHERE qq_id IN ({placeholders}) FOR UPDATE", chunk
+                )
+                existing = [int(row[0]) for row in await cur.fetchall()]
+                if existing:
+                    await self._cursor_execute(
+                        cur, "member_delete",
+                        f"DELETE FROM {self.TABLE_USERS} WHERE qq_id IN ({', '.join(['%s'] * len(existing))})", existing
+                    )
+                    deleted.extend(existing)
+                for table in (self.TABLE_LEDGER, self.TABLE_LEDGER_SUMMARY):
+                    await self._cursor_execute(
+                        cur, "member_delete_ledger", f"DELETE FROM {table} WHERE qq_id IN ({placeholders})", chunk
+                    )
+            return deleted
+
+        return await self._run_transaction("member_delete", body)
+
+    # --- 用户数据导出 / 导入 ---
+    async def iter_users(self, batch_size):
+        # SSCursor 为服务端游标：结果集留在服务器上逐批读取，客户端内存只保存一批
+        async with self._acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await self._cursor_execute(
+                    cur, "users_export", f"SELECT qq_id, points, last_checkin FROM {self.TABLE_USERS} ORDER BY qq_id"
+                )
+                while True:
+                    start = time.perf_counter()
+                    rows = await cur.fetchmany(batch_size)
+                    self.metrics.observe("query", "users_export_fetch", time.perf_counter() - start)
+                    if not rows:
+                        break
+                    yield [
+                        (int(qq_id), points, last_checkin.isoformat() if last_checkin else None)
+                        for qq_id, points, last_checkin in rows
+                    ]
+
+    async def import_users(self, batches, threaded=False):
+        async def body(cur):
+            changes = []
+            while True:
+                if threaded:
+                    batch = await asyncio.to_thread(next, batches, None)
+                else:
+                    batch = next(batches, None)
+                if batch is None:
+                    return changes
+
+                rows = {int(row[0]): row for row in batch}
+                await self._cursor_execute(
+                    cur, "users_import_lock",
+                    f"SELECT qq_id, points FROM {self.TABLE_USERS} WHERE qq_id IN ({', '.join(['%s'] * len(rows))}) FOR UPDATE",
+                    list(rows)
+                )
+                existing = {int(qq_id): points for qq_id, points in await cur.fetchall()}
+                placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+                args = [value for row in rows.values() for value in row]
+                await self._cursor_execute(
+                    cur, "users_import_batch",
+                    f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES {placeholders} "
+                    f"ON DUPLICATE KEY UPDATE points = VALUES(points), last_checkin = VALUES(last_checkin)",
+                    args
+                )
+                changes.extend((qq_id, existing.get(qq_id, 0), row[1]) for qq_id, row in rows.items())
+
+        return await self._run_transaction("users_import", body, replayable=False)
+
+    # --- 兑换码与库存 ---
+    async def redeem(self, qq_id, item_type, item_name, cost):
+        async def body(cur):
+            # 1. 锁定并检查用户积分
+            await self._cursor_execute(cur, "redeem_lock_user", f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = %s FOR UPDATE", (qq_id,))
+            row = await cur.fetchone()
+            points = row[0] if row else None
+
+            # 积分不足与库存为空属于正常的业务结果：此前没有写入，事务照常结束，不计入回滚统计
+            if (points or 0) < cost:
+                return RedeemResult(REDEEM_INSUFFICIENT_POINTS, points)
+
+            # 2. 锁定并获取一个兑换码；SKIP LOCKED 让并发兑换各自取到不同的码而无需等待
+            lock_clause = "FOR UPDATE SKIP LOCKED" if self.supports_skip_locked else "FOR UPDATE"
+            await self._cursor_execute(
+                cur, "redeem_lock_code",
+                f"SELECT id, code FROM {self.TABLE_CODES} WHERE item_type = %s ORDER BY id LIMIT 1 {lock_clause}",
+                (item_type,)
+            )
+            code_record = await cur.fetchone()
+
+            if not code_record:
+                return RedeemResult(REDEEM_OUT_OF_STOCK, points)
+
+            code_id, the_code = code_record
+
+            # 3. 扣除积分
+            await self._cursor_execute(cur, "redeem_deduct_points", f"UPDATE {self.TABLE_USERS} SET points = points - %s WHERE qq_id = %s", (cost, qq_id))
+
+            # 4. 删除已使用的兑换码
+            await self._cursor_execute(cur, "redeem_delete_code", f"DELETE FROM {self.TABLE_CODES} WHERE id = %s", (code_id,))
+
+            # 5. 写入发送箱，与扣分、删码同时提交，保证兑换码不会丢失
+            await self._cursor_execute(
+                cur, "redeem_outbox_insert",
+                f"INSERT INTO {self.TABLE_OUTBOX} (qq_id, item_name, cost, code) VALUES (%s, %s, %s, %s)",
+                (qq_id, item_name, cost, the_code)
+            )
+            return RedeemResult(REDEEM_OK, points, the_code, cur.lastrowid)
+
+        return await self._run_transaction("redeem", body)
+
+    async def import_codes(self, item_type, batches, threaded=False):
+        async def body(cur):
+            added_count = 0
+            while True:
+                if threaded:
+                    batch = await asyncio.to_thread(next, batches, None)
+                else:
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+
+                placeholders = ", ".join(["(%s, %s)"] * len(batch))
+                args = [value for code in batch for value in (code, item_type)]
+                await self._cursor_execute(cur, "import_codes_batch", f"INSERT IGNORE INTO {self.TABLE_CODES} (code, item_type) VALUES {placeholders}", args)
+                added_count += cur.rowcount
+
+            if added_count:
+                await self._cursor_execute(
+                    cur, "import_stock_add",
+                    f"INSERT INTO {self.TABLE_STOCK} (item_type, stock) VALUES (%s, %s) "
+                    f"ON DUPLICATE KEY UPDATE stock = stock + VALUES(stock)",
+                    (item_type, added_count)
+                )
+            return added_count
+
+        return await self._run_transaction("import_codes", body, replayable=False)
+
+    async def load_stock(self):
+        results = await self._execute_query(f"SELECT item_type, stock FROM {self.TABLE_STOCK}", fetch='all', label="stock_load")
+        return {row[0]: row[1] for row in results}
+
+    async def reconcile_stock(self):
+        async def body(cur):
+            # 先锁定计数表 (含间隙)：导入在其事务中累加计数，会等到本次重写提交后再累加；
+            # 锁定之后才做的计数是一致性读，已包含此前提交的导入，且不对 codes 加锁，不阻塞并发兑换
+            await self._cursor_execute(cur, "stock_reconcile_lock", f"SELECT item_type FROM {self.TABLE_STOCK} FOR UPDATE")
+            await self._cursor_execute(
+                cur, "stock_reconcile_count", f"SELECT item_type, COUNT(*) FROM {self.TABLE_CODES} GROUP BY item_type"
+            )
+            counts = {row[0]: row[1] for row in await cur.fetchall()}
+            await self._cursor_execute(cur, "stock_reconcile_clear", f"DELETE FROM {self.TABLE_STOCK}")
+            if counts:
+                placeholders = ", ".join(["(%s, %s)"] * len(counts))
+                args = [value for item in counts.items() for value in item]
+                await self._cursor_execute(cur, "stock_reconcile_write", f"INSERT INTO {self.TABLE_STOCK} (item_type, stock) VALUES {placeholders}", args)
+            return counts
+
+        return await self._run_transaction("stock_reconcile", body)
+
+    async def add_stock(self, item_type, delta):
+        await self._execute_query(
+            f"UPDATE {self.TABLE_STOCK} SET stock = GREATEST(stock + %s, 0) WHERE item_type = %s",
+            (delta, item_type), label="stock_flush", retry=False
+        )
+
+    # --- 白名单 ---
+    async def load_whitelist(self):
+        results = await self._execute_query(f"SELECT group_id FROM {self.TABLE_WHITELIST}", fetch='all', label="whitelist_load")
+        return {int(row[0]) for row in results}
+
+    async def add_whitelist(self, group_id):
+        return await self._execute_query(f"INSERT IGNORE INTO {self.TABLE_WHITELIST} (group_id) VALUES (%s)", (group_id,)) > 0
+
+    async def remove_whitelist(self, group_id):
+        return await self._execute_query(f"DELETE FROM {self.TABLE_WHITELIST} WHERE group_id = %s", (group_id,)) > 0
+
+    # --- 兑换码发送箱 ---
+    async def load_due_outbox(self, now, limit):
+        query = (
+            f"SELECT id, qq_id, item_name, cost, code, attempts FROM {self.TABLE_OUTBOX} "
+            f"WHERE status = %s AND next_attempt_at <= %s ORDER BY id LIMIT %s"
+        )
+        return list(await self._execute_query(query, (OUTBOX_PENDING, now, limit), fetch='all', label="outbox_load_due"))
+
+    async def claim_outbox(self, outbox_id, now, lease_until):
+        claimed = await self._execute_query(
+            f"UPDATE {self.TABLE_OUTBOX} SET next_attempt_at = %s "
+            f"WHERE id = %s AND status = %s AND next_attempt_at <= %s",
+            (lease_until, outbox_id, OUTBOX_PENDING, now), label="outbox_claim"
+        )
+        return claimed > 0
+
+    async def delete_outbox(self, outbox_id):
+        await self._execute_query(f"DELETE FROM {self.TABLE_OUTBOX} WHERE id = %s", (outbox_id,), label="outbox_delete")
+
+    async def mark_outbox_failed(self, outbox_id, attempts, next_attempt_at, error, final):
+        await self._execute_query(
+            f"UPDATE {self.TABLE_OUTBOX} SET status = %s, attempts = %s, next_attempt_at = %s, last_error = %s WHERE id = %s",
+            (OUTBOX_FAILED if final else OUTBOX_PENDING, attempts, next_attempt_at, error[:255], outbox_id),
+            label="outbox_mark_failed"
+        )
+
+    async def requeue_failed_outbox(self, qq_id=None):
+        query = f"UPDATE {self.TABLE_OUTBOX} SET status = %s, attempts = 0, next_attempt_at = 0 WHERE status = %s"
+        args = [OUTBOX_PENDING, OUTBOX_FAILED]
+        if qq_id:
+            query += " AND qq_id = %s"
+            args.append(qq_id)
+        return await self._execute_query(query, tuple(args), label="outbox_requeue")
+
+    # --- 积分流水 ---
+    async def append_ledger(self, entries):
+        async def body(cur):
+            for start in range(0, len(entries), self.CHUNK_SIZE):
+                chunk = entries[start:start + self.CHUNK_SIZE]
+                placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))
+                args = [value for entry in chunk for value in entry]
+                await self._cursor_execute(
+                    cur, "ledger_append",
+                    f"INSERT INTO {self.TABLE_LEDGER} (qq_id, delta, reason, item, created_at) VALUES {placeholders}", args
+                )
+
+        await self._run_transaction("ledger_append", body)
+
+    async def ledger_page(self, qq_id, before_id, limit):
+        columns = "id, delta, reason, item, created_at"
+        if before_id:
+            rows = await self._execute_query(
+                f"SELECT {columns} FROM {self.TABLE_LEDGER} WHERE qq_id = %s AND id < %s ORDER BY id DESC LIMIT %s",
+                (qq_id, before_id, limit), fetch='all', label="ledger_page"
+            )
+        else:
+            rows = await self._execute_query(
+                f"SELECT {columns} FROM {self.TABLE_LEDGER} WHERE qq_id = %s ORDER BY id DESC LIMIT %s",
+                (qq_id, limit), fetch='all', label="ledger_page"
+            )
+        return list(rows)
+
+    async def ledger_summary(self, qq_id):
+        row = await self._execute_query(
+            f"SELECT delta_total, entries, last_at FROM {self.TABLE_LEDGER_SUMMARY} WHERE qq_id = %s",
+            (qq_id,), fetch='one', label="ledger_summary"
+        )
+        return tuple(row) if row else None
+
+    async def compact_ledger(self, before, limit):
+        row = await self._execute_query(
+            f"SELECT MAX(id) FROM (SELECT id, created_at FROM {self.TABLE_LEDGER} ORDER BY id LIMIT %s) AS head "
+            f"WHERE created_at < %s",
+            (limit, before), fetch='one', label="ledger_compact_scan"
+        )
+        upper_id = row[0] if row else None
+        if not upper_id:
+            return 0
+
+        async def body(cur):
+            await self._cursor_execute(
+                cur, "ledger_compact_summarize",
+                f"INSERT INTO {self.TABLE_LEDGER_SUMMARY} (qq_id, delta_total, entries, last_at) "
+                f"SELECT qq_id, SUM(delta), COUNT(*), MAX(created_at) FROM {self.TABLE_LEDGER} WHERE id <= %s GROUP BY qq_id "
+                f"ON DUPLICATE KEY UPDATE delta_total = delta_total + VALUES(delta_total), "
+                f"entries = entries + VALUES(entries), last_at = GREATEST(last_at, VALUES(last_at))",
+                (upper_id,)
+            )
+            await self._cursor_execute(cur, "ledger_compact_delete", f"DELETE FROM {self.TABLE_LEDGER} WHERE id <= %s", (upper_id,))
+            return cur.rowcount
+
+        return await self._run_transaction("ledger_compact", body)
@@ -0,0 +1,526 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from astrbot.api import logger
+
+from .base import (
+    CHECKIN_DUPLICATE, CHECKIN_NEW, CHECKIN_UPDATED, OUTBOX_FAILED, OUTBOX_PENDING, OUTBOX_SENT,
+    REDEEM_INSUFFICIENT_POINTS, REDEEM_OK, REDEEM_OUT_OF_STOCK, RedeemResult, StorageBackend,
+)
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    嵌入式 SQLite 存储，适合单机部署：无需 MySQL 服务，也没有网络往返。
+
+    - WAL 模式：读取不阻塞写入，读操作在只读连接上由读线程并发执行
+    - 单写者：所有写操作进入队列，由唯一的写任务交给专用写线程执行；
+      队列中积压的写操作合并为一个事务提交，每个操作各占一个 SAVEPOINT，失败时只回滚自身
+    - 语句均为固定文本的参数化语句，sqlite3 按语句文本缓存编译结果，重复执行时无需重新编译
+    """
+    name = "sqlite"
+    READER_THREADS = 2
+    # 单个事务最多合并的写操作数
+    WRITE_BATCH_LIMIT = 256
+    STATEMENT_CACHE_SIZE = 256
+    BUSY_TIMEOUT_SECONDS = 5
+    # SQLite INTEGER 的最大值，键集分页的第一页以此为上界，使两种情况共用一条语句
+    MAX_ROW_ID = 2 ** 63 - 1
+
+    def __init__(self, path: str, metrics):
+        super().__init__(metrics)
+        self.path = path
+        self._write_conn = None
+        self._write_queue: asyncio.Queue | None = None
+        self._writer_task = None
+        self._writer = None
+        self._readers = None
+        self._reader_local = threading.local()
+        self._reader_conns: list[sqlite3.Connection] = []
+
+    # --- 生命周期 ---
+    async def open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="checkin-sqlite-writer")
+        self._readers = ThreadPoolExecutor(self.READER_THREADS, thread_name_prefix="checkin-sqlite-reader")
+        loop = asyncio.get_running_loop()
+        self._write_conn = await loop.run_in_executor(self._writer, self._open_writer)
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        logger.info(f"SQLite 数据库已打开: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：由本类显式管理事务
+        conn = sqlite3.connect(
+            self.path, timeout=self.BUSY_TIMEOUT_SECONDS, isolation_level=None,
+            check_same_thread=False, cached_statements=self.STATEMENT_CACHE_SIZE,
+        )
+        # WAL 模式下 NORMAL 仅在检查点时同步磁盘，进程崩溃不会丢失已提交的数据
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = self._connect()
+        journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            logger.warning(f"SQLite 无法启用 WAL 模式 (当前为 {journal_mode})，读写将互相阻塞。")
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE_USERS} (
+                qq_id INTEGER PRIMARY KEY, points INTEGER NOT NULL DEFAULT 0, last_checkin TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_users_points ON {self.TABLE_USERS} (points);
+            CREATE TABLE IF NOT EXISTS {self.TABLE_CODES} (
+                id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE, item_type TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_codes_item_type ON {self.TABLE_CODES} (item_type, id);
+            CREATE TABLE IF NOT EXISTS {self.TABLE_WHITELIST} (group_id INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS {self.TABLE_STOCK} (
+                item_type TEXT PRIMARY KEY, stock INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS {self.TABLE_OUTBOX} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, qq_id INTEGER NOT NULL,
+                item_name TEXT NOT NULL, cost INTEGER NOT NULL, code TEXT NOT NULL,
+                status INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at INTEGER NOT NULL DEFAULT 0, last_error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON {self.TABLE_OUTBOX} (status, next_attempt_at);
+            CREATE INDEX IF NOT EXISTS idx_outbox_qq_id ON {self.TABLE_OUTBOX} (qq_id);
+            CREATE TABLE IF NOT EXISTS {self.TABLE_LEDGER} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, qq_id INTEGER NOT NULL, delta INTEGER NOT NULL,
+                reason TEXT NOT NULL, item TEXT, created_at INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_qq_id ON {self.TABLE_LEDGER} (qq_id, id);
+            CREATE TABLE IF NOT EXISTS {self.TABLE_LEDGER_SUMMARY} (
+                qq_id INTEGER PRIMARY KEY, delta_total INTEGER NOT NULL DEFAULT 0,
+                entries INTEGER NOT NULL DEFAULT 0, last_at INTEGER NOT NULL DEFAULT 0
+            );
+            """)
+        # 旧版本会保留已发送的记录 (含兑换码明文)，在此清除
+        purged = conn.execute(f"DELETE FROM {self.TABLE_OUTBOX} WHERE status = ?", (OUTBOX_SENT,)).rowcount
+        if purged:
+            logger.info(f"已清除发送箱中 {purged} 条已发送的记录。")
+        logger.info("数据库表初始化检查完成。")
+        return conn
+
+    async def close(self):
+        if self._writer_task:
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        if self._write_queue:
+            while not self._write_queue.empty():
+                future = self._write_queue.get_nowait()[3]
+                if not future.done():
+                    future.set_exception(RuntimeError("SQLite 存储已关闭"))
+        # 等待线程中正在执行的操作结束后再关闭连接
+        for executor in (self._writer, self._readers):
+            if executor:
+                await asyncio.to_thread(executor.shutdown)
+        self._writer = self._readers = None
+        for conn in [self._write_conn] + self._reader_conns:
+            if conn:
+                conn.close()
+        self._write_conn = None
+        self._reader_conns.clear()
+
+    def status_text(self) -> str:
+        queued = self._write_queue.qsize() if self._write_queue else 0
+        return f"[SQLite] 写队列 {queued}，数据库文件 {self.path}"
+
+    # --- 执行器 ---
+    async def _read(self, label: str, fn, *args):
+        """在读线程的只读连接上执行 fn(conn, *args)。"""
+        if not self._readers:
+            raise RuntimeError("SQLite 存储未打开，无法执行查询。")
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._readers, self._run_read, fn, args)
+        finally:
+            self.metrics.observe("query", label, time.perf_counter() - start)
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        conn = self._connect()
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _run_read(self, fn, args):
+        conn = getattr(self._reader_local, "conn", None)
+        if conn is None:
+            conn = self._reader_local.conn = self._connect_reader()
+            self._reader_conns.append(conn)
+        return fn(conn, *args)
+
+    async def _write(self, label: str, fn, *args):
+        """将 fn(conn, *args) 交给写任务，在写事务中执行并返回其结果。"""
+        if not self._writer_task:
+            raise RuntimeError("SQLite 存储未打开，无法执行写入。")
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((label, fn, args, future, time.perf_counter()))
+        return await future
+
+    async def _writer_loop(self):
+        """唯一的写任务：取出队列中积压的写操作，合并为一个事务在写线程中执行。"""
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._write_queue.get()]
+            while len(jobs) < self.WRITE_BATCH_LIMIT and not self._write_queue.empty():
+                jobs.append(self._write_queue.get_nowait())
+            started = time.perf_counter()
+            try:
+                outcomes = await loop.run_in_executor(self._writer, self._run_write_batch, jobs)
+            except asyncio.CancelledError:
+                for job in jobs:
+                    if not job[3].done():
+                        job[3].set_exception(RuntimeError("SQLite 存储已关闭"))
+                raise
+            except Exception as e:
+                # 提交失败：本批操作全部回滚
+                logger.error(f"SQLite 写事务提交失败 ({len(jobs)} 个操作): {e}", exc_info=True)
+                for job in jobs:
+                    if not job[3].done():
+                        job[3].set_exception(e)
+                continue
+
+            self.metrics.peak("sqlite_write_batch", len(jobs))
+            for (label, _, _, future, queued_at), (ok, value, elapsed) in zip(jobs, outcomes):
+                self.metrics.observe("pool", "write_queue_wait", started - queued_at)
+                self.metrics.observe("query", label, elapsed)
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _run_write_batch(self, jobs) -> list[tuple]:
+        conn = self._write_conn
+        outcomes = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for _, fn, args, _, _ in jobs:
+                start = time.perf_counter()
+                conn.execute("SAVEPOINT job")
+                try:
+                    value = fn(conn, *args)
+                    conn.execute("RELEASE job")
+                    outcomes.append((True, value, time.perf_counter() - start))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((False, e, time.perf_counter() - start))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return outcomes
+
+    # --- 用户积分 ---
+    def _checkin_tx(self, conn, qq_id, first_points, today, bonus):
+        row = conn.execute(f"SELECT points, last_checkin FROM {self.TABLE_USERS} WHERE qq_id = ?", (qq_id,)).fetchone()
+        if row is None:
+            conn.execute(
+                f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (?, ?, ?)", (qq_id, first_points, today)
+            )
+            return CHECKIN_NEW, first_points
+        points, last_checkin = row
+        # 日期以 ISO 格式存储，字符串比较即日期比较
+        if last_checkin is not None and last_checkin >= today:
+            return CHECKIN_DUPLICATE, None
+        conn.execute(
+            f"UPDATE {self.TABLE_USERS} SET points = ?, last_checkin = ? WHERE qq_id = ?", (points + bonus, today, qq_id)
+        )
+        return CHECKIN_UPDATED, points + bonus
+
+    async def checkin(self, qq_id, first_points, today, bonus):
+        return await self._write("checkin_upsert", self._checkin_tx, int(qq_id), first_points, today.isoformat(), bonus)
+
+    async def get_points(self, qq_id, label="query_points"):
+        def query(conn):
+            row = conn.execute(f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = ?", (int(qq_id),)).fetchone()
+            return row[0] if row else None
+        return await self._read(label, query)
+
+    async def top_users(self, limit, offset=0, label="leaderboard_page"):
+        def query(conn):
+            return conn.execute(
+                f"SELECT qq_id, points FROM {self.TABLE_USERS} ORDER BY points DESC, qq_id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return await self._read(label, query)
+
+    async def count_users_ahead(self, qq_id, points):
+        def query(conn):
+            return conn.execute(
+                f"SELECT COUNT(*) FROM {self.TABLE_USERS} WHERE points >= ? AND (points > ? OR qq_id > ?)",
+                (points, points, int(qq_id))
+            ).fetchone()[0]
+        return await self._read("rank_count", query)
+
+    def _adjust_points_tx(self, conn, qq_id, delta):
+        row = conn.execute(f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = ?", (qq_id,)).fetchone()
+        if row is None:
+            new_points = max(0, delta)
+            if new_points <= 0:
+                return None
+            conn.execute(f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (?, ?, NULL)", (qq_id, new_points))
+            return 0, new_points
+        new_points = max(0, row[0] + delta)
+        conn.execute(f"UPDATE {self.TABLE_USERS} SET points = ? WHERE qq_id = ?", (new_points, qq_id))
+        return row[0], new_points
+
+    async def adjust_points(self, qq_id, delta):
+        return await self._write("adjust_points", self._adjust_points_tx, int(qq_id), delta)
+
+    def _bulk_adjust_points_tx(self, conn, qq_ids, delta):
+        changes = []
+        for start in range(0, len(qq_ids), self.CHUNK_SIZE):
+            chunk = qq_ids[start:start + self.CHUNK_SIZE]
+            placeholders = ", ".join(["?"] * len(chunk))
+            existing = dict(conn.execute(f"SELECT qq_id, points FROM {self.TABLE_USERS} WHERE qq_id IN ({placeholders})", chunk))
+            if existing:
+                conn.execute(f"UPDATE {self.TABLE_USERS} SET points = MAX(points + ?, 0) WHERE qq_id IN ({placeholders})", [delta, *chunk])
+                changes.extend((qq_id, points, max(0, points + delta)) for qq_id, points in existing.items())
+            missing = [qq_id for qq_id in chunk if qq_id not in existing]
+            if delta > 0 and missing:
+                conn.execute(
+                    f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES "
+                    + ", ".join(["(?, ?, NULL)"] * len(missing)),
+                    [value for qq_id in missing for value in (qq_id, delta)]
+                )
+                changes.extend((qq_id, 0, delta) for qq_id in missing)
+        return changes
+
+    async def bulk_adjust_points(self, qq_ids, delta):
+        qq_ids = list(dict.fromkeys(int(qq_id) for qq_id in qq_ids))
+        return await self._write("bulk_adjust", self._bulk_adjust_points_tx, qq_ids, delta)
+
+    def _delete_users_tx(self, conn, qq_ids):
+        deleted = []
+        for start in range(0, len(qq_ids), self.CHUNK_SIZE):
+            chunk = qq_ids[start:start + self.CHUNK_SIZE]
+            placeholders = ", ".join(["?"] * len(chunk))
+            existing = [row[0] for row in conn.execute(f"SELECT qq_id FROM {self.TABLE_USERS} WHERE qq_id IN ({placeholders})", chunk)]
+            if existing:
+                conn.execute(f"DELETE FROM {self.TABLE_USERS} WHERE qq_id IN ({placeholders})", chunk)
+                deleted.extend(existing)
+            for table in (self.TABLE_LEDGER, self.TABLE_LEDGER_SUMMARY):
+                conn.execute(f"DELETE FROM {table} WHERE qq_id IN ({placeholders})", chunk)
+        return deleted
+
+    async def delete_users(self, qq_ids):
+        return await self._write("member_delete", self._delete_users_tx, [int(qq_id) for qq_id in qq_ids])
+
+    # --- 用户数据导出 / 导入 ---
+    async def iter_users(self, batch_size):
+        # 使用独立的只读连接：游标在整个读事务内看到同一快照 (WAL)，不占用读线程的共享连接
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self._readers, self._connect_reader)
+        try:
+            cursor = await loop.run_in_executor(
+                self._readers, conn.execute, f"SELECT qq_id, points, last_checkin FROM {self.TABLE_USERS} ORDER BY qq_id"
+            )
+            while True:
+                start = time.perf_counter()
+                rows = await loop.run_in_executor(self._readers, cursor.fetchmany, batch_size)
+                self.metrics.observe("query", "users_export_fetch", time.perf_counter() - start)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            await loop.run_in_executor(self._readers, conn.close)
+
+    def _import_users_tx(self, conn, batches):
+        changes = []
+        for batch in batches:
+            rows = {int(row[0]): row for row in batch}
+            # 批次大小可配置，按 CHUNK_SIZE 分段查询原积分，避免超出 SQLite 的参数个数上限
+            qq_ids, existing = list(rows), {}
+            for start in range(0, len(qq_ids), self.CHUNK_SIZE):
+                chunk = qq_ids[start:start + self.CHUNK_SIZE]
+                existing.update(conn.execute(
+                    f"SELECT qq_id, points FROM {self.TABLE_USERS} WHERE qq_id IN ({', '.join(['?'] * len(chunk))})", chunk
+                ))
+            conn.executemany(
+                f"INSERT INTO {self.TABLE_USERS} (qq_id, points, last_checkin) VALUES (?, ?, ?) "
+                f"ON CONFLICT (qq_id) DO UPDATE SET points = excluded.points, last_checkin = excluded.last_checkin",
+                rows.values()
+            )
+            changes.extend((qq_id, existing.get(qq_id, 0), row[1]) for qq_id, row in rows.items())
+        return changes
+
+    async def import_users(self, batches, threaded=False):
+        return await self._write("users_import", self._import_users_tx, batches)
+
+    # --- 兑换码与库存 ---
+    def _redeem_tx(self, conn, qq_id, item_type, item_name, cost):
+        # 写操作由单一写者串行执行，无需行锁
+        row = conn.execute(f"SELECT points FROM {self.TABLE_USERS} WHERE qq_id = ?", (qq_id,)).fetchone()
+        points = row[0] if row else None
+        if (points or 0) < cost:
+            return RedeemResult(REDEEM_INSUFFICIENT_POINTS, points)
+
+        code_record = conn.execute(
+            f"SELECT id, code FROM {self.TABLE_CODES} WHERE item_type = ? ORDER BY id LIMIT 1", (item_type,)
+        ).fetchone()
+        if not code_record:
+            return RedeemResult(REDEEM_OUT_OF_STOCK, points)
+        code_id, the_code = code_record
+
+        conn.execute(f"UPDATE {self.TABLE_USERS} SET points = points - ? WHERE qq_id = ?", (cost, qq_id))
+        conn.execute(f"DELETE FROM {self.TABLE_CODES} WHERE id = ?", (code_id,))
+        outbox_id = conn.execute(
+            f"INSERT INTO {self.TABLE_OUTBOX} (qq_id, item_name, cost, code) VALUES (?, ?, ?, ?)",
+            (qq_id, item_name, cost, the_code)
+        ).lastrowid
+        return RedeemResult(REDEEM_OK, points, the_code, outbox_id)
+
+    async def redeem(self, qq_id, item_type, item_name, cost):
+        return await self._write("redeem", self._redeem_tx, int(qq_id), item_type, item_name, cost)
+
+    def _import_codes_tx(self, conn, item_type, batches):
+        # 迭代器在写线程中推进，读取文件不会阻塞事件循环
+        added_count = 0
+        for batch in batches:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {self.TABLE_CODES} (code, item_type) VALUES (?, ?)",
+                [(code, item_type) for code in batch]
+            )
+            added_count += conn.total_changes - before
+        if added_count:
+            conn.execute(
+                f"INSERT INTO {self.TABLE_STOCK} (item_type, stock) VALUES (?, ?) "
+                f"ON CONFLICT (item_type) DO UPDATE SET stock = stock + excluded.stock",
+                (item_type, added_count)
+            )
+        return added_count
+
+    async def import_codes(self, item_type, batches, threaded=False):
+        return await self._write("import_codes", self._import_codes_tx, item_type, batches)
+
+    async def load_stock(self):
+        def query(conn):
+            return dict(conn.execute(f"SELECT item_type, stock FROM {self.TABLE_STOCK}").fetchall())
+        return await self._read("stock_load", query)
+
+    def _reconcile_stock_tx(self, conn):
+        # 在写事务中计数并重写，期间不会有兑换插入，结果精确
+        counts = dict(conn.execute(f"SELECT item_type, COUNT(*) FROM {self.TABLE_CODES} GROUP BY item_type").fetchall())
+        conn.execute(f"DELETE FROM {self.TABLE_STOCK}")
+        conn.executemany(f"INSERT INTO {self.TABLE_STOCK} (item_type, stock) VALUES (?, ?)", counts.items())
+        return counts
+
+    async def reconcile_stock(self):
+        return await self._write("stock_reconcile", self._reconcile_stock_tx)
+
+    async def add_stock(self, item_type, delta):
+        def tx(conn):
+            conn.execute(f"UPDATE {self.TABLE_STOCK} SET stock = MAX(stock + ?, 0) WHERE item_type = ?", (delta, item_type))
+        await self._write("stock_flush", tx)
+
+    # --- 白名单 ---
+    async def load_whitelist(self):
+        def query(conn):
+            return {row[0] for row in conn.execute(f"SELECT group_id FROM {self.TABLE_WHITELIST}")}
+        return await self._read("whitelist_load", query)
+
+    async def add_whitelist(self, group_id):
+        def tx(conn):
+            return conn.execute(f"INSERT OR IGNORE INTO {self.TABLE_WHITELIST} (group_id) VALUES (?)", (group_id,)).rowcount > 0
+        return await self._write("whitelist_add", tx)
+
+    async def remove_whitelist(self, group_id):
+        def tx(conn):
+            return conn.execute(f"DELETE FROM {self.TABLE_WHITELIST} WHERE group_id = ?", (group_id,)).rowcount > 0
+        return await self._write("whitelist_remove", tx)
+
+    # --- 兑换码发送箱 ---
+    async def load_due_outbox(self, now, limit):
+        def query(conn):
+            return conn.execute(
+                f"SELECT id, qq_id, item_name, cost, code, attempts FROM {self.TABLE_OUTBOX} "
+                f"WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (OUTBOX_PENDING, now, limit)
+            ).fetchall()
+        return await self._read("outbox_load_due", query)
+
+    async def claim_outbox(self, outbox_id, now, lease_until):
+        def tx(conn):
+            return conn.execute(
+                f"UPDATE {self.TABLE_OUTBOX} SET next_attempt_at = ? WHERE id = ? AND status = ? AND next_attempt_at <= ?",
+                (lease_until, outbox_id, OUTBOX_PENDING, now)
+            ).rowcount > 0
+        return await self._write("outbox_claim", tx)
+
+    async def delete_outbox(self, outbox_id):
+        def tx(conn):
+            conn.execute(f"DELETE FROM {self.TABLE_OUTBOX} WHERE id = ?", (outbox_id,))
+        await self._write("outbox_delete", tx)
+
+    async def mark_outbox_failed(self, outbox_id, attempts, next_attempt_at, error, final):
+        def tx(conn):
+            conn.execute(
+                f"UPDATE {self.TABLE_OUTBOX} SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (OUTBOX_FAILED if final else OUTBOX_PENDING, attempts, next_attempt_at, error[:255], outbox_id)
+            )
+        await self._write("outbox_mark_failed", tx)
+
+    async def requeue_failed_outbox(self, qq_id=None):
+        def tx(conn):
+            query = f"UPDATE {self.TABLE_OUTBOX} SET status = ?, attempts = 0, next_attempt_at = 0 WHERE status = ?"
+            args = [OUTBOX_PENDING, OUTBOX_FAILED]
+            if qq_id:
+                query += " AND qq_id = ?"
+                args.append(int(qq_id))
+            return conn.execute(query, args).rowcount
+        return await self._write("outbox_requeue", tx)
+
+    # --- 积分流水 ---
+    async def append_ledger(self, entries):
+        def tx(conn):
+            conn.executemany(
+                f"INSERT INTO {self.TABLE_LEDGER} (qq_id, delta, reason, item, created_at) VALUES (?, ?, ?, ?, ?)", entries
+            )
+        await self._write("ledger_append", tx)
+
+    async def ledger_page(self, qq_id, before_id, limit):
+        def query(conn):
+            return conn.execute(
+                f"SELECT id, delta, reason, item, created_at FROM {self.TABLE_LEDGER} "
+                f"WHERE qq_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (int(qq_id), before_id or self.MAX_ROW_ID, limit)
+            ).fetchall()
+        return await self._read("ledger_page", query)
+
+    async def ledger_summary(self, qq_id):
+        def query(conn):
+            return conn.execute(
+                f"SELECT delta_total, entries, last_at FROM {self.TABLE_LEDGER_SUMMARY} WHERE qq_id = ?", (int(qq_id),)
+            ).fetchone()
+        return await self._read("ledger_summary", query)
+
+    def _compact_ledger_tx(self, conn, before, limit):
+        upper_id = conn.execute(
+            f"SELECT MAX(id) FROM (SELECT id, created_at FROM {self.TABLE_LEDGER} ORDER BY id LIMIT ?) WHERE created_at < ?",
+            (limit, before)
+        ).fetchone()[0]
+        if upper_id is None:
+            return 0
+        conn.execute(
+            f"INSERT INTO {self.TABLE_LEDGER_SUMMARY} (qq_id, delta_total, entries, last_at) "
+            f"SELECT qq_id, SUM(delta), COUNT(*), MAX(created_at) FROM {self.TABLE_LEDGER} WHERE id <= ? GROUP BY qq_id "
+            f"ON CONFLICT (qq_id) DO UPDATE SET delta_total = delta_total + excluded.delta_total, "
+            f"entries = entries + excluded.entries, last_at = MAX(last_at, excluded.last_at)",
+            (upper_id,)
+        )
+        return conn.execute(f"DELETE FROM {self.TABLE_LEDGER} WHERE id <= ?", (upper_id,)).rowcount
+
+    async def compact_ledger(self, before, limit):
+        return await self._write("ledger_compact", self._compact_ledger_tx, before, limit)